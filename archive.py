@@ -0,0 +1,126 @@
+"""归档：把已完成或过于久远的日程分批移到单独的归档库。
+
+归档库与主库放在同一目录（schedule.db 对应 schedule_archive.db），需要时通过 ATTACH 以
+archive 的名字挂到连接上，表结构与 schedules 相同，另记归档时间。主库只保留仍然有用的行，
+列表、搜索和提醒查询以及它们的索引都随之变小。
+
+- 已完成且早于 COMPLETED_DAYS 天的日程、以及早于 HORIZON_DAYS 天的所有一次性日程会被归档；
+  重复日程是仍在生效的规则，不归档；
+- 每批最多移动 ARCHIVE_BATCH 行：先在归档库的事务中复制并提交，再在主库的事务中删除。
+  两个库分别提交（WAL 模式下跨库事务不保证原子性），中途退出时行会在两边同时存在，
+  下一批用 INSERT OR REPLACE 重新复制后删除，不会丢失；
+- maintain 在归档之后回收主库的空闲页（auto_vacuum=INCREMENTAL 时）并更新统计信息。
+"""
+import os
+from datetime import date, timedelta
+
+ARCHIVE_SCHEMA = 'archive'
+ARCHIVE_BATCH = 500       # 每批移动的行数，写锁只持有这一批的时间
+COMPLETED_DAYS = 30       # 已完成的日程在这么多天后归档
+HORIZON_DAYS = 365        # 早于这么多天的一次性日程无论状态都归档
+VACUUM_PAGES = 2000       # 每次维护最多回收的空闲页数
+ANALYSIS_LIMIT = 1000     # ANALYZE 每个索引抽样的行数上限，使统计耗时与表大小无关
+
+# 与 schedules 相同的列（生成列除外），复制时按名称对应
+COLUMNS = ('id, title, date, time, description, priority, status, category, reminder, create_time, '
+           'due_at, notified, rrule, duration')
+
+SCHEMA = [
+    f'''
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.schedules (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        date TEXT NOT NULL,
+        time TEXT NOT NULL,
+        description TEXT,
+        priority TEXT,
+        status TEXT,
+        category TEXT,
+        reminder INTEGER,
+        create_time TIMESTAMP,
+        due_at TEXT,
+        notified INTEGER,
+        rrule TEXT,
+        duration INTEGER,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        priority_rank INTEGER GENERATED ALWAYS AS (
+            CASE priority WHEN '高' THEN 0 WHEN '普通' THEN 1 WHEN '低' THEN 2 ELSE 3 END) VIRTUAL,
+        status_rank INTEGER GENERATED ALWAYS AS (
+            CASE status WHEN '未完成' THEN 0 WHEN '已完成' THEN 1 ELSE 2 END) VIRTUAL
+    )
+    ''',
+    f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_date_time ON schedules (date, time)',
+]
+
+
+def archive_path(db_path):
+    root, extension = os.path.splitext(db_path)
+    return f'{root}_archive{extension or ".db"}'
+
+
+def attach(conn, path):
+    # ATTACH 不能在事务中执行；归档库同样使用 WAL，搜索线程读取时不阻塞归档
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (path,))
+    conn.execute(f'PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL')
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def cutoffs(today=None, completed_days=COMPLETED_DAYS, horizon_days=HORIZON_DAYS):
+    # 返回 (已完成日程的截止日期, 所有一次性日程的截止日期)，早于截止日期的行被归档
+    today = today or date.today()
+    return ((today - timedelta(days=completed_days)).isoformat(),
+            (today - timedelta(days=horizon_days)).isoformat())
+
+
+def move_batch(conn, completed_before, horizon, limit=ARCHIVE_BATCH):
+    """把最多 limit 行移入归档库，返回移动的行数；小于 limit 说明已没有可归档的行。
+
+    两个条件分别走 (date, time) 和 (status, date, time) 索引的范围扫描。
+    """
+    ids = [row[0] for row in conn.execute('''
+        SELECT id FROM main.schedules WHERE date < ? AND rrule IS NULL LIMIT ?
+    ''', (horizon, limit))]
+    if len(ids) < limit:
+        ids += [row[0] for row in conn.execute('''
+            SELECT id FROM main.schedules
+            WHERE status = '已完成' AND date >= ? AND date < ? AND rrule IS NULL LIMIT ?
+        ''', (horizon, completed_before, limit - len(ids)))]
+    if not ids:
+        return 0
+
+    placeholders = ', '.join('?' * len(ids))
+    conn.execute(f'''
+        INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.schedules ({COLUMNS})
+        SELECT {COLUMNS} FROM main.schedules WHERE id IN ({placeholders})
+    ''', ids)
+    conn.commit()
+    # 删除时由触发器同步全文索引、每日汇总和区间索引
+    conn.execute(f'DELETE FROM main.schedules WHERE id IN ({placeholders})', ids)
+    conn.commit()
+    return len(ids)
+
+
+def maintain(conn):
+    # 回收删除留下的空闲页并更新查询计划使用的统计信息，返回回收的页数
+    if conn.in_transaction:
+        conn.commit()
+    freed = 0
+    if conn.execute('PRAGMA main.auto_vacuum').fetchone()[0] == 2:
+        before = conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+        # execute 只执行一步（回收一页），executescript 会执行到结束
+        conn.executescript(f'PRAGMA main.incremental_vacuum({VACUUM_PAGES})')
+        freed = before - conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+    conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+    conn.execute('ANALYZE main')
+    conn.commit()
+    return freed
+
+
+def enable_incremental_vacuum(conn):
+    # 已有的数据库需要整理一次才能切换为 INCREMENTAL；耗时与库大小成正比，只在命令行中手动执行
+    conn.execute('PRAGMA main.auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM main')
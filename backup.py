@@ -0,0 +1,237 @@
+"""在线备份：用 SQLite 的 backup 接口把数据库复制到数据目录下的 backups 文件夹。
+
+- 复制在单独的线程和连接上进行，每步 BACKUP_PAGES 页，两步之间休眠 BACKUP_SLEEP 秒；
+  复制期间源连接保持一个读事务，WAL 模式下不阻塞界面和其他程序的写入，得到的是开始时刻的
+  一致快照，也不会因为期间有写入而从头重新复制；
+- 归档库存在时一并复制，文件名与主库的备份对应（见 archive.archive_path）；
+- 每份备份以时间（精确到微秒）命名，只保留最近 KEEP_BACKUPS 份；
+- 自上一份备份以来没有任何提交（PRAGMA data_version 未变）时跳过；
+- restore 先用 PRAGMA integrity_check 检查备份，再通过 backup 接口一步写回，完成后再检查一次。
+  正在运行的窗口通过 data_version 发现变化并重新读取。
+"""
+import glob
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import archive
+from schedule_store import BUSY_TIMEOUT
+
+BACKUP_DIR = 'backups'
+BACKUP_PREFIX = 'schedule-'
+BACKUP_PAGES = 256   # 每步复制的页数
+BACKUP_SLEEP = 0.05  # 两步之间的休眠（秒），期间其他连接可以获得锁
+KEEP_BACKUPS = 10
+STALE_PART = 3600    # 超过这么久（秒）的临时文件视为中途退出留下的
+
+
+def backup_dir(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), BACKUP_DIR)
+
+
+def list_backups(directory):
+    # 按时间从旧到新；归档库的备份随主库的备份一起处理，不单独列出
+    paths = glob.glob(os.path.join(directory, BACKUP_PREFIX + '*.db'))
+    return sorted(path for path in paths if not path.endswith('_archive.db'))
+
+
+def attach_archive(conn, db_path):
+    # 归档库可能在打开连接之后才创建，每次备份前检查
+    path = archive.archive_path(db_path)
+    if archive.ARCHIVE_SCHEMA not in schemas(conn) and os.path.exists(path):
+        conn.execute(f'ATTACH DATABASE ? AS {archive.ARCHIVE_SCHEMA}', (path,))
+
+
+def schemas(conn):
+    return [row[1] for row in conn.execute('PRAGMA database_list') if row[1] != 'temp']
+
+
+def data_version(conn):
+    return tuple(conn.execute(f'PRAGMA {name}.data_version').fetchone()[0] for name in schemas(conn))
+
+
+def modified_since(db_path, backup_path):
+    # 进程启动后还没有可比较的 data_version 时，按文件修改时间判断
+    backed_up = os.path.getmtime(backup_path)
+    for path in (db_path, archive.archive_path(db_path)):
+        for name in (path, path + '-wal'):
+            if os.path.exists(name) and os.path.getmtime(name) > backed_up:
+                return True
+    return False
+
+
+def reserve(directory):
+    # 以微秒命名，并用 O_EXCL 创建临时文件占住名字：同一时刻的另一次备份（包括其他进程）
+    # 会换一个名字，不会覆盖已有的备份
+    while True:
+        path = os.path.join(directory, datetime.now().strftime(BACKUP_PREFIX + '%Y%m%d-%H%M%S-%f.db'))
+        if os.path.exists(path):
+            continue
+        try:
+            os.close(os.open(path + '.part', os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return path
+
+
+def snapshot(conn, directory, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """把 conn 上的主库和归档库复制为一份新的备份，返回主库备份的路径。"""
+    os.makedirs(directory, exist_ok=True)
+    path = reserve(directory)
+    targets = [(name, path if name == 'main' else archive.archive_path(path)) for name in schemas(conn)]
+
+    # 读事务在所有库上开始之后才复制，各库取自同一时刻
+    try:
+        conn.execute('BEGIN')
+        for name, _ in targets:
+            conn.execute(f'SELECT COUNT(*) FROM {name}.sqlite_master').fetchone()
+        for name, target_path in targets:
+            target = sqlite3.connect(target_path + '.part')
+            try:
+                conn.backup(target, pages=pages, sleep=sleep, name=name)
+                # 源库为 WAL 模式，备份改回回滚日志，成为可以直接复制的单个文件
+                target.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target.close()
+    except BaseException:
+        for _, target_path in targets:
+            if os.path.exists(target_path + '.part'):
+                os.remove(target_path + '.part')
+        raise
+    finally:
+        conn.rollback()
+
+    # 全部复制完成后才改名，list_backups 不会看到不完整的备份
+    for _, target_path in reversed(targets):
+        os.replace(target_path + '.part', target_path)
+    return path
+
+
+def prune(directory, keep=KEEP_BACKUPS):
+    # 删除最近 keep 份之外的备份，返回删除的主库备份路径
+    removed = list_backups(directory)[:-keep] if keep > 0 else []
+    for path in removed:
+        for name in (path, archive.archive_path(path)):
+            if os.path.exists(name):
+                os.remove(name)
+    for name in glob.glob(os.path.join(directory, '*.part')):
+        if time.time() - os.path.getmtime(name) > STALE_PART:
+            os.remove(name)
+    return removed
+
+
+def verify(path):
+    # 返回 integrity_check 发现的问题，没有问题时为空列表
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"备份不存在：{path}")
+    conn = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    finally:
+        conn.close()
+    return [] if problems == ['ok'] else problems
+
+
+def restore(backup_path, db_path):
+    """用备份替换当前数据库（包括归档库）。
+
+    通过 backup 接口整库一步写回，不需要关闭其他连接，写锁只在复制期间持有；
+    备份或恢复结果未通过 integrity_check 时抛出 ValueError。
+    """
+    pairs = [(backup_path, db_path)]
+    if os.path.exists(archive.archive_path(backup_path)) or os.path.exists(archive.archive_path(db_path)):
+        pairs.append((archive.archive_path(backup_path), archive.archive_path(db_path)))
+    for source_path, _ in pairs:
+        if source_path == backup_path or os.path.exists(source_path):
+            problems = verify(source_path)
+            if problems:
+                raise ValueError(f"备份已损坏：{source_path}：{problems[0]}")
+
+    for source_path, target_path in pairs:
+        target = sqlite3.connect(target_path, timeout=BUSY_TIMEOUT)
+        try:
+            if os.path.exists(source_path):
+                source = sqlite3.connect(source_path)
+                try:
+                    source.backup(target)
+                finally:
+                    source.close()
+                # 备份是回滚日志模式，恢复后与其他连接一样使用 WAL
+                target.execute('PRAGMA journal_mode=WAL')
+            else:
+                # 备份时还没有归档库，当时所有日程都在主库中
+                target.execute('DELETE FROM schedules')
+                target.commit()
+            problems = [row[0] for row in target.execute('PRAGMA integrity_check')]
+        finally:
+            target.close()
+        if problems != ['ok']:
+            raise ValueError(f"恢复后的数据库未通过检查：{target_path}：{problems[0]}")
+
+
+class BackupWorker:
+    """在单独的线程中备份；request 提交一次备份，poll 在界面线程中取出结果。
+
+    结果为新备份的路径、None（没有变化而跳过）或备份时发生的异常。
+    """
+
+    def __init__(self, db_path, directory=None, keep=KEEP_BACKUPS):
+        self.db_path = db_path
+        self.directory = directory or backup_dir(db_path)
+        self.keep = keep
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.version = None  # 上一份备份时源连接的 data_version，仅由工作线程访问
+        self.thread = None
+
+    def request(self):
+        if self.thread is None:
+            # 第一次备份时才启动线程和连接
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        self.jobs.put(True)
+
+    def poll(self):
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def close(self):
+        # 不等待正在进行的复制；留下的临时文件由之后的 prune 清理
+        self.jobs.put(None)
+
+    def run(self):
+        conn = None
+        while True:
+            if self.jobs.get() is None:
+                break
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+                self.results.put(self.backup(conn))
+            except (sqlite3.Error, OSError) as e:
+                self.results.put(e)
+        if conn is not None:
+            conn.close()
+
+    def backup(self, conn):
+        attach_archive(conn, self.db_path)
+        version = data_version(conn)
+        if self.version is None:
+            backups = list_backups(self.directory)
+            unchanged = bool(backups) and not modified_since(self.db_path, backups[-1])
+        else:
+            unchanged = version == self.version
+        if unchanged:
+            self.version = version
+            return None
+        path = snapshot(conn, self.directory)
+        self.version = version
+        prune(self.directory, self.keep)
+        return path
@@ -0,0 +1,284 @@
+"""性能基准测试。
+
+生成与 schedules 表结构一致的合成数据库（默认 1k/10k/100k 行，可加 1M），
+在无界面环境下计时列表刷新、搜索、分类筛选、冲突检测、提醒、导出、批量导入和启动迁移等路径，
+结果以 JSON 输出，并可与保存的基线比较以发现性能回退：
+
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json      # 有回退时退出码为 1
+    python benchmark.py --sizes 1000000 --output result.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from migrations import suspend_insert_triggers, resume_insert_triggers
+import schedule_io
+from schedule_store import ScheduleStore, ListOrder, DEFAULT_ORDER
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_REPEAT = 5
+LIST_PAGE = 100          # 与 schedule.PAGE_SIZE 相同
+HEAVY_ROWS = 100000      # 达到该行数时，导出、导入等耗时较长的项目只执行一次
+REGRESSION_RATIO = 1.25  # 中位数超过基线的该倍数视为回退
+REGRESSION_FLOOR = 1.0   # 毫秒；低于该差值的波动不计
+
+CATEGORY_WEIGHTS = {'工作': 45, '学习': 15, '生活': 25, '默认': 10, '其他': 5}
+PRIORITY_WEIGHTS = {'普通': 60, '高': 25, '低': 15}
+REMINDER_RATIO = 0.2
+
+TITLES = {
+    '工作': (['产品', '项目', '客户', '季度', '部门', '技术', '市场', '预算'],
+             ['周会', '评审', '复盘', '汇报', '对接', '需求讨论', '进度同步', '方案演示']),
+    '学习': (['英语', '算法', '数据库', '设计模式', '财务', '写作'],
+             ['课程', '练习', '读书笔记', '考试', '线上讲座']),
+    '生活': (['家庭', '朋友', '健身', '社区', '宠物'],
+             ['聚餐', '采购', '体检', '看牙医', '跑步', '打扫卫生', '缴费']),
+    '默认': (['临时', '其他', '个人'], ['事项', '提醒', '安排']),
+    '其他': (['杂项', '备忘'], ['记录', '待办']),
+}
+DESCRIPTIONS = [
+    '', '', '',
+    '准备相关材料，提前十分钟到场',
+    '会议室 A302，记得带电脑',
+    '需要确认上周的遗留问题',
+    'Follow up with the team about the release plan',
+    '地址见日历附件；如有变动电话联系',
+]
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def synthetic_rows(count, seed=0, today=None):
+    # 日期分布在今天前后一年内，时间按 15 分钟取整；过去的日程大多已完成、已提醒
+    rng = random.Random(seed)
+    today = today or date.today()
+    for _ in range(count):
+        category = weighted(rng, CATEGORY_WEIGHTS)
+        prefixes, subjects = TITLES[category]
+        day = today + timedelta(days=rng.randint(-365, 365))
+        minutes = rng.randrange(7 * 60, 22 * 60, 15)
+        date_text = day.isoformat()
+        time_text = f'{minutes // 60:02d}:{minutes % 60:02d}'
+        past = day < today
+        status = '已完成' if past and rng.random() < 0.8 else '未完成'
+        reminder = 1 if rng.random() < REMINDER_RATIO else 0
+        yield (
+            rng.choice(prefixes) + rng.choice(subjects) + (f' #{rng.randint(1, 99)}' if rng.random() < 0.3 else ''),
+            date_text, time_text, rng.choice(DESCRIPTIONS), category,
+            weighted(rng, PRIORITY_WEIGHTS), status, reminder,
+            f'{date_text} {time_text}', 1 if reminder and past else 0,
+        )
+
+
+def generate_database(path, rows, seed=0):
+    # 与批量导入相同：写入期间暂停逐行的插入触发器，写完后一次性补齐
+    store = ScheduleStore(path)
+    conn = store.conn
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        suspended = suspend_insert_triggers(cursor)
+        cursor.executemany('''
+            INSERT INTO schedules (title, date, time, description, category, priority, status,
+                                   reminder, due_at, notified)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', synthetic_rows(rows, seed))
+        resume_insert_triggers(cursor, suspended, 0)
+        conn.commit()
+        conn.execute('ANALYZE')
+    finally:
+        store.close()
+
+
+def dataset(data_dir, rows, seed):
+    # 生成的数据库按行数和种子缓存，重复运行时直接复用
+    path = os.path.join(data_dir, f'schedules_{rows}_{seed}.db')
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        generate_database(path + '.tmp', rows, seed)
+        os.replace(path + '.tmp', path)
+        print(f"生成 {rows} 行数据用时 {time.perf_counter() - started:.1f} 秒", file=sys.stderr)
+    return path
+
+
+def measure(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'repeat': repeat,
+    }
+
+
+def first_page(store, search_term='', category='全部', order=DEFAULT_ORDER):
+    # refresh_list：统计总行数并读取第一页；搜索时与界面相同，
+    # 先取得全部匹配行的排序键，再按主键取第一页
+    if search_term:
+        keys = [order.wrap(row[:-2]) for row in store.matches(search_term, category, order)]
+        return store.page(('offset', 0, LIST_PAGE), search_keys=keys)
+    where, params = store.filter('', category)
+    store.count(where, params)
+    return store.page(('offset', 0, LIST_PAGE), where, params, order=order)
+
+
+def deep_scroll(store, pages=20, order=DEFAULT_ORDER):
+    # 从列表中部开始按键集分页连续向下滚动
+    where, params = store.filter()
+    rows = store.page(('offset', store.count(where, params) // 2, LIST_PAGE), where, params, order=order)
+    for _ in range(pages):
+        if not rows:
+            break
+        rows = store.page(('after', order.key(rows[-1]), LIST_PAGE), where, params, order=order)
+
+
+def run_size(path, rows, repeat, work_dir):
+    store = ScheduleStore(path)
+    heavy = 1 if rows >= HEAVY_ROWS else repeat
+    results = {}
+
+    results['startup_open'] = measure(lambda: ScheduleStore(path).close(), repeat)
+
+    fresh = os.path.join(work_dir, 'fresh.db')
+
+    def remove_fresh():
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(fresh + suffix):
+                os.remove(fresh + suffix)
+
+    results['startup_migrate_new'] = measure(lambda: ScheduleStore(fresh).close(), repeat, remove_fresh)
+
+    results['refresh_list'] = measure(lambda: first_page(store), repeat)
+    results['filter_category'] = measure(lambda: first_page(store, category='学习'), repeat)
+    results['search_fts'] = measure(lambda: first_page(store, '项目周会'), repeat)
+    results['search_short'] = measure(lambda: first_page(store, '周会'), repeat)
+    results['search_miss'] = measure(lambda: first_page(store, '不存在的日程'), repeat)
+    results['scroll_keyset'] = measure(lambda: deep_scroll(store), repeat)
+    # 点击表头按其他列排序，同样走索引和键集分页
+    by_priority = ListOrder('priority', descending=True)
+    results['sort_priority'] = measure(lambda: first_page(store, order=by_priority), repeat)
+    results['sort_scroll'] = measure(lambda: deep_scroll(store, order=ListOrder('title')), repeat)
+
+    # add_schedule 前的冲突检测与一周内的空闲时间查找
+    today = date.today().isoformat()
+    results['conflict_check'] = measure(lambda: store.conflicts(today, '10:00', 60), repeat)
+    results['free_slots'] = measure(
+        lambda: store.free_slots(today, (date.today() + timedelta(days=7)).isoformat(), 30), repeat)
+
+    # check_reminders：启动时载入待提醒队列，到期时认领
+    results['reminders_load'] = measure(store.pending_reminders, repeat)
+    # 认领不检查到期时间，取最早的 100 条作为同时到期的一批
+    due = sorted(store.pending_reminders())[:100]
+
+    def reset_reminders():
+        store.conn.executemany('UPDATE schedules SET notified = 0, due_at = ? WHERE id = ?', due)
+        store.conn.commit()
+
+    results['reminders_claim'] = measure(lambda: store.claim_reminders(due), repeat, reset_reminders)
+    reset_reminders()
+
+    csv_path = os.path.join(work_dir, 'export.csv')
+    for fmt, (label, extension) in schedule_io.EXPORT_FORMATS.items():
+        target = os.path.join(work_dir, 'export' + extension)
+        results[f'export_{fmt}'] = measure(lambda: store.export(target, fmt), heavy)
+
+    def import_rows():
+        fresh_store = ScheduleStore(fresh)
+        try:
+            fresh_store.import_csv(csv_path)
+        finally:
+            fresh_store.close()
+
+    results['bulk_import'] = measure(import_rows, heavy, remove_fresh)
+    remove_fresh()
+
+    store.close()
+    return results
+
+
+def compare(results, baseline, ratio=REGRESSION_RATIO):
+    # 返回 (行数, 项目, 基线, 本次) 列表，只比较两边都有的项目
+    regressions = []
+    for rows, items in results.items():
+        for name, result in items.items():
+            base = baseline.get(rows, {}).get(name)
+            if base is None:
+                continue
+            current, previous = result['median_ms'], base['median_ms']
+            if current > previous * ratio and current - previous > REGRESSION_FLOOR:
+                regressions.append((rows, name, previous, current))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="日程管理性能基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'schedule_benchmark'),
+                        help="生成的数据库缓存目录")
+    parser.add_argument('--output', help="结果 JSON 文件（默认输出到标准输出）")
+    parser.add_argument('--baseline', help="与该基线比较，有回退时退出码为 1")
+    parser.add_argument('--save-baseline', help="把本次结果保存为基线")
+    parser.add_argument('--ratio', type=float, default=REGRESSION_RATIO)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.sizes:
+            path = dataset(args.data_dir, rows, args.seed)
+            print(f"测试 {rows} 行……", file=sys.stderr)
+            report['results'][str(rows)] = run_size(path, rows, args.repeat, work_dir)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(report['results'], baseline, args.ratio)
+        for rows, name, previous, current in regressions:
+            print(f"性能回退：{rows} 行 {name} {previous:.1f} ms -> {current:.1f} ms", file=sys.stderr)
+        if regressions:
+            return 1
+        print("与基线相比没有性能回退", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""日历视图：月、周、日三种显示方式。
+
+月视图只读取每天的汇总（ScheduleStore.day_summary），周、日视图读取范围内展开后的各次日程
+（ScheduleStore.occurrences），都在后台读线程中执行。读取结果按 (模式, 起止日期, 分类)
+缓存在有界的 LRU 中；日程变化后调用 invalidate，只丢弃包含受影响日期的缓存。
+"""
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from schedule_store import ScheduleStore
+
+CALENDAR_CACHE = 32  # 最多缓存的范围数
+MONTH_WEEKS = 6      # 月视图固定显示 6 周
+WEEKDAY_NAMES = ('一', '二', '三', '四', '五', '六', '日')
+
+
+def month_range(day):
+    # 月视图显示的范围：从 1 日所在周的周一开始的 6 周
+    first = day.replace(day=1)
+    start = first - timedelta(days=first.weekday())
+    return start, start + timedelta(days=MONTH_WEEKS * 7)
+
+
+def week_range(day):
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=7)
+
+
+class CalendarView:
+    def __init__(self, parent, db, category_var, show_error):
+        self.db = db
+        self.category_var = category_var
+        self.show_error = show_error
+        self.mode = 'month'
+        self.day = date.today()
+        self.cache = OrderedDict()
+        self.generation = 0
+        self.invalidations = 0  # invalidate 的次数，读取期间发生过时结果不再写入缓存
+        self.visible = False
+
+        self.frame = ttk.Frame(parent)
+
+        nav_frame = ttk.Frame(self.frame)
+        nav_frame.pack(fill=tk.X, pady=5)
+        ttk.Button(nav_frame, text="<", width=3, command=lambda: self.move(-1)).pack(side=tk.LEFT)
+        ttk.Button(nav_frame, text="今天", command=self.today).pack(side=tk.LEFT, padx=5)
+        ttk.Button(nav_frame, text=">", width=3, command=lambda: self.move(1)).pack(side=tk.LEFT)
+        self.title_label = ttk.Label(nav_frame, font=('微软雅黑', 11, 'bold'))
+        self.title_label.pack(side=tk.LEFT, padx=10)
+        self.mode_var = tk.StringVar(value=self.mode)
+        for mode, text in (('day', '日'), ('week', '周'), ('month', '月')):
+            ttk.Radiobutton(nav_frame, text=text, value=mode, variable=self.mode_var,
+                            command=lambda: self.set_mode(self.mode_var.get())).pack(side=tk.RIGHT)
+
+        # 月视图：6x7 的日期格，每格显示日期和当天的日程数
+        self.month_frame = ttk.Frame(self.frame)
+        for column, name in enumerate(WEEKDAY_NAMES):
+            ttk.Label(self.month_frame, text=name, anchor=tk.CENTER).grid(row=0, column=column, sticky=tk.EW)
+            self.month_frame.columnconfigure(column, weight=1, uniform='day')
+        self.cells = []
+        for row in range(MONTH_WEEKS):
+            self.month_frame.rowconfigure(row + 1, weight=1, uniform='week')
+            for column in range(7):
+                cell = tk.Label(self.month_frame, anchor=tk.NW, justify=tk.LEFT, relief=tk.GROOVE,
+                                bg='white', padx=4, pady=2)
+                cell.grid(row=row + 1, column=column, sticky=tk.NSEW)
+                self.cells.append(cell)
+
+        # 周、日视图：按时间顺序列出范围内的各次日程
+        columns = ('date', 'time', 'title', 'category', 'priority', 'status')
+        self.agenda = ttk.Treeview(self.frame, columns=columns, show='headings')
+        for column, text, width in (('date', '日期', 100), ('time', '时间', 60), ('title', '标题', 200),
+                                    ('category', '分类', 80), ('priority', '优先级', 60), ('status', '状态', 60)):
+            self.agenda.heading(column, text=text)
+            self.agenda.column(column, width=width)
+
+    def set_visible(self, visible):
+        self.visible = visible
+        if visible:
+            self.refresh()
+
+    def set_mode(self, mode, day=None):
+        self.mode = mode
+        self.mode_var.set(mode)
+        if day is not None:
+            self.day = day
+        self.refresh()
+
+    def today(self):
+        self.day = date.today()
+        self.refresh()
+
+    def move(self, step):
+        if self.mode == 'month':
+            year, month = divmod(self.day.year * 12 + self.day.month - 1 + step, 12)
+            self.day = self.day.replace(year=year, month=month + 1, day=1)
+        else:
+            self.day += timedelta(days=step * (7 if self.mode == 'week' else 1))
+        self.refresh()
+
+    def current_range(self):
+        if self.mode == 'month':
+            return month_range(self.day)
+        if self.mode == 'week':
+            return week_range(self.day)
+        return self.day, self.day + timedelta(days=1)
+
+    def invalidate(self, day=None):
+        # day 为受影响的日期文本；为 None 时（如重复日程、批量导入）丢弃全部缓存
+        self.invalidations += 1
+        if day is None:
+            self.cache.clear()
+        else:
+            for key in [key for key in self.cache if key[1] <= day < key[2]]:
+                del self.cache[key]
+        if self.visible:
+            self.refresh()
+
+    def refresh(self):
+        if not self.visible:
+            return
+        start, end = self.current_range()
+        key = (self.mode, start.isoformat(), end.isoformat(), self.category_var.get())
+        self.show_title(start, end)
+        self.generation += 1
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.render(key, self.cache[key])
+            return
+
+        generation = self.generation
+        invalidations = self.invalidations
+        fn = ScheduleStore.day_summary if self.mode == 'month' else ScheduleStore.occurrences
+
+        def loaded(result):
+            # 读取期间数据有变化时，结果可能是写入之前的，不缓存也不显示；
+            # invalidate 已为可见的视图重新读取
+            if invalidations != self.invalidations:
+                return
+            self.cache[key] = result
+            while len(self.cache) > CALENDAR_CACHE:
+                self.cache.popitem(last=False)
+            if generation == self.generation:
+                self.render(key, result)
+
+        # 快速翻页时只执行最后一次读取
+        self.db.read(fn, *key[1:], callback=loaded, errback=self.show_error, key='calendar')
+
+    def show_title(self, start, end):
+        if self.mode == 'month':
+            text = f"{self.day.year} 年 {self.day.month} 月"
+        elif self.mode == 'week':
+            text = f"{start.isoformat()} ~ {(end - timedelta(days=1)).isoformat()}"
+        else:
+            text = f"{self.day.isoformat()} 星期{WEEKDAY_NAMES[self.day.weekday()]}"
+        self.title_label.config(text=text)
+
+    def render(self, key, result):
+        if self.mode == 'month':
+            self.agenda.pack_forget()
+            self.month_frame.pack(fill=tk.BOTH, expand=True)
+            self.render_month(date.fromisoformat(key[1]), result)
+        else:
+            self.month_frame.pack_forget()
+            self.agenda.pack(fill=tk.BOTH, expand=True)
+            self.agenda.delete(*self.agenda.get_children())
+            for schedule_id, title, day, time, category, priority, status in result:
+                self.agenda.insert('', tk.END, values=(day, time, title, category, priority, status))
+
+    def render_month(self, start, summary):
+        today = date.today()
+        for index, cell in enumerate(self.cells):
+            day = start + timedelta(days=index)
+            total, pending, high = summary.get(day.isoformat(), (0, 0, 0))
+            text = str(day.day)
+            if total:
+                text += f"\n{total} 项" + (f"\n未完成 {pending}" if pending else '')
+            cell.config(
+                text=text,
+                fg='black' if day.month == self.day.month else 'gray',
+                bg='#fff3cd' if day == today else ('#fde2e1' if high else 'white'),
+            )
+            cell.bind('<Button-1>', lambda e, day=day: self.set_mode('day', day))
@@ -0,0 +1,178 @@
+"""后台数据库执行器。
+
+一个写线程串行执行所有写操作，若干读线程在 WAL 模式下各自持有连接并发查询，
+界面线程不再直接访问 SQLite。每个线程通过 open_store() 创建自己的 ScheduleStore，
+任务函数的签名为 fn(store, *args)，一般直接使用 ScheduleStore 的方法；提交后返回 Future，
+完成后由 poll（通过 after 在 Tk 线程中定时调用）执行回调，回调中可以安全地操作界面。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+DB_POLL = 16  # 有未完成任务时检查结果的间隔（毫秒），约为一帧
+
+
+class Task:
+    __slots__ = ('fn', 'args', 'future', 'callback', 'errback', 'key', 'queued')
+
+    def __init__(self, fn, args, callback, errback, key):
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.callback = callback
+        self.errback = errback
+        self.key = key
+        self.queued = None
+
+    @property
+    def name(self):
+        return getattr(self.fn, '__qualname__', repr(self.fn))
+
+
+class DatabaseExecutor:
+    def __init__(self, open_store, after, readers=2, observer=None):
+        self.open_store = open_store
+        self.after = after  # after(delay_ms, callback)，一般为 root.after
+        # 可选的 diagnostics.Diagnostics，为 None 时任务和回调直接执行，没有额外开销
+        self.observer = observer
+        self.reads = queue.Queue()
+        self.writes = queue.Queue()
+        self.completed = queue.Queue()
+        self.pending_keys = {}
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.polling = False
+
+        # 写线程先打开数据库（包括结构迁移），读线程等它完成后再打开，迁移只执行一次
+        self.writer_opened = threading.Event()
+        self.threads = [threading.Thread(target=self.run, args=(self.writes, True), daemon=True)]
+        self.threads += [threading.Thread(target=self.run, args=(self.reads, False), daemon=True)
+                         for _ in range(readers)]
+        for thread in self.threads:
+            thread.start()
+
+    def read(self, fn, *args, callback=None, errback=None, key=None):
+        # 带 key 的读任务会合并：同一 key 尚未开始执行的旧任务被取消，只执行最新的一个
+        return self.submit(self.reads, fn, args, callback, errback, key)
+
+    def write(self, fn, *args, callback=None, errback=None):
+        return self.submit(self.writes, fn, args, callback, errback, None)
+
+    def reporter(self, callback):
+        # 返回可在工作线程中调用的函数，参数会在 Tk 线程中交给 callback（用于进度显示）
+        return lambda *args: self.completed.put((callback, args))
+
+    def submit(self, tasks, fn, args, callback, errback, key):
+        task = Task(fn, args, callback, errback, key)
+        if self.observer is not None:
+            task.queued = time.perf_counter()
+        if key is not None:
+            with self.lock:
+                previous = self.pending_keys.get(key)
+                if previous is not None:
+                    previous.future.cancel()
+                self.pending_keys[key] = task
+
+        self.outstanding += 1
+        tasks.put(task)
+        if not self.polling:
+            self.polling = True
+            self.after(DB_POLL, self.poll)
+        return task.future
+
+    def connect(self):
+        try:
+            return self.open_store(), None
+        except Exception as e:
+            return None, e
+
+    def run(self, tasks, writer):
+        # 打开数据库在工作线程中进行，不阻塞界面的首次绘制。读线程等写线程完成迁移后再打开，
+        # 避免多个连接同时迁移、互相等待写锁直到超时
+        if not writer:
+            self.writer_opened.wait()
+        store, error = self.connect()
+        if writer:
+            self.writer_opened.set()
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            if task.key is not None:
+                with self.lock:
+                    if self.pending_keys.get(task.key) is task:
+                        del self.pending_keys[task.key]
+            if task.future.set_running_or_notify_cancel():
+                if store is None:
+                    # 打开失败（例如其他程序正持有写锁）时每个任务都重新尝试，仍失败才以该错误结束
+                    store, error = self.connect()
+                if store is None:
+                    task.future.set_exception(error)
+                else:
+                    try:
+                        if self.observer is None:
+                            result = task.fn(store, *task.args)
+                        else:
+                            result = self.observer.run_task(task.name, task.fn, store, task.args, task.queued)
+                    except BaseException as e:
+                        store.rollback()
+                        task.future.set_exception(e)
+                    else:
+                        task.future.set_result(result)
+            self.completed.put(task)
+        if store is not None:
+            store.close()
+
+    def poll(self):
+        # 在 Tk 线程中执行：把已完成任务的结果交给回调。某个回调抛出异常时其余结果照常处理，
+        # 下一次 poll 也照常安排，最后再抛出第一个异常，不会因一次出错而丢掉之后的所有结果
+        error = None
+        while True:
+            try:
+                item = self.completed.get_nowait()
+            except queue.Empty:
+                break
+            if not isinstance(item, tuple):
+                self.outstanding -= 1
+            try:
+                unhandled = self.deliver(item)
+            except Exception as e:
+                unhandled = e
+            if error is None:
+                error = unhandled
+
+        if self.outstanding:
+            self.after(DB_POLL, self.poll)
+        else:
+            self.polling = False
+        if error is not None:
+            raise error
+
+    def deliver(self, item):
+        # 执行一个结果的回调；任务出错而没有 errback 时返回该异常
+        if isinstance(item, tuple):
+            callback, args = item
+            callback(*args)
+            return None
+        future = item.future
+        if future.cancelled():
+            return None
+        exception = future.exception()
+        if exception is None:
+            if item.callback and self.observer is not None:
+                self.observer.callback(item.name, item.callback, future.result())
+            elif item.callback:
+                item.callback(future.result())
+        elif item.errback:
+            item.errback(exception)
+        else:
+            return exception
+        return None
+
+    def close(self, timeout=5):
+        # 已排队的任务会先执行完；写线程结束前等待，避免退出时丢失写入
+        for _ in self.threads[1:]:
+            self.reads.put(None)
+        self.writes.put(None)
+        self.threads[0].join(timeout)
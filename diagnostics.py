@@ -0,0 +1,380 @@
+"""可选的性能诊断：界面处理函数、后台数据库任务和 SQL 语句的耗时统计。
+
+默认关闭，此时主程序不导入本模块，也不包装任何函数；用 --diagnostics 或环境变量
+SCHEDULE_DIAGNOSTICS=1 启动时开启：
+
+- 界面处理函数和数据库任务的回调按名称记录耗时直方图；
+- 数据库任务记录排队时间、执行时间和返回的行数；
+- 连接使用 TimedConnection（由 ScheduleStore 的 factory 参数指定），只统计每条语句的
+  execute 和 fetch 调用本身的耗时，两次调用之间 Python 的处理时间不计入；
+  超过 SLOW_QUERY_MS 的语句连同 EXPLAIN QUERY PLAN 写入日志；
+- 日志为按大小轮转的 JSON Lines 文件，退出时追加一份汇总；
+- DiagnosticsWindow 在程序内显示统计和最近的慢查询。
+"""
+import json
+import logging
+import logging.handlers
+import sqlite3
+import threading
+import time
+import tkinter as tk
+from collections import deque
+from datetime import datetime
+from tkinter import ttk
+
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # 直方图各档上限（毫秒）
+SLOW_QUERY_MS = 50     # 超过该耗时的语句记录执行计划
+SLOW_HANDLER_MS = 100  # 超过该耗时的界面处理函数写入日志
+RECENT_SLOW = 50       # 诊断窗口中保留的慢查询条数
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+WINDOW_REFRESH = 1000  # 诊断窗口的刷新间隔（毫秒）
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max', 'rows')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def add(self, ms, rows=0):
+        index = 0
+        while index < len(BUCKETS) and ms > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.rows += rows
+
+    def percentile(self, fraction):
+        # 按所在档的上限估计，最后一档用最大值
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return 0.0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 2) if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': round(self.max, 2),
+            'rows': self.rows,
+            'buckets': dict(zip([*map(str, BUCKETS), 'inf'], self.counts)),
+        }
+
+
+def row_count(result):
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return 0
+
+
+class TimedCursor(sqlite3.Cursor):
+    """累计本游标当前语句在 execute 和 fetch 中的耗时，语句结束时交给 Diagnostics。
+
+    语句在重新 execute、取完所有行、关闭游标或任务结束时结束。
+    """
+
+    def timed(self, fn, *args):
+        diagnostics = self.connection.diagnostics
+        if diagnostics is None:
+            return fn(*args)
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.ms += (time.perf_counter() - started) * 1000
+
+    def begin(self, sql, parameters=()):
+        # 参数随语句保存，慢查询的 EXPLAIN 需要同样的绑定
+        self.finish()
+        self.sql = sql
+        self.parameters = parameters
+        self.ms = 0.0
+        diagnostics = self.connection.diagnostics
+        if diagnostics is not None:
+            diagnostics.opened(self)
+
+    def finish(self):
+        sql = getattr(self, 'sql', None)
+        if sql is not None:
+            self.sql = None
+            diagnostics = self.connection.diagnostics
+            if diagnostics is not None:
+                diagnostics.finished(self, sql, self.parameters, self.ms)
+
+    def execute(self, sql, parameters=()):
+        self.begin(sql, parameters)
+        return self.timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # 参数可能是只能遍历一次的生成器，只在是列表时取第一组用于 EXPLAIN
+        first = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else None
+        self.begin(sql, first)
+        return self.timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, script):
+        self.begin(script)
+        try:
+            return self.timed(super().executescript, script)
+        finally:
+            self.finish()
+
+    def fetchone(self):
+        row = self.timed(super().fetchone)
+        if row is None:
+            self.finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self.timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        try:
+            return self.timed(super().fetchall)
+        finally:
+            self.finish()
+
+    def __next__(self):
+        try:
+            return self.timed(super().__next__)
+        except StopIteration:
+            self.finish()
+            raise
+
+    def close(self):
+        self.finish()
+        super().close()
+
+
+class TimedConnection(sqlite3.Connection):
+    # Connection.execute 等快捷方法不经过 cursor()，需要分别改为使用 TimedCursor
+    diagnostics = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+class Diagnostics:
+    """线程安全的统计收集器；log_path 为 None 时只在内存中统计。"""
+
+    connection_class = TimedConnection  # 需要统计语句的连接以此创建，再交给 attach
+
+    def __init__(self, log_path=None):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.slow = deque(maxlen=RECENT_SLOW)
+        self.local = threading.local()
+        self.logger = None
+        if log_path:
+            self.logger = logging.getLogger(f'schedule.diagnostics.{id(self)}')
+            self.logger.propagate = False
+            self.logger.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES,
+                                                           backupCount=LOG_BACKUPS, encoding='utf-8')
+            self.logger.addHandler(handler)
+
+    def log(self, kind, **fields):
+        if self.logger is not None:
+            record = {'time': datetime.now().isoformat(timespec='milliseconds'), 'type': kind, **fields}
+            self.logger.info(json.dumps(record, ensure_ascii=False))
+
+    def record(self, name, ms, rows=0):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(ms, rows)
+
+    # 界面处理函数
+
+    def timed(self, name, fn):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                ms = (time.perf_counter() - started) * 1000
+                self.record(name, ms)
+                if ms > SLOW_HANDLER_MS:
+                    self.log('slow_handler', name=name, ms=round(ms, 2))
+        return wrapper
+
+    # 数据库任务与语句（在工作线程中调用）
+
+    def attach(self, conn):
+        # conn 须由 TimedConnection 创建，否则不统计语句
+        if isinstance(conn, TimedConnection):
+            conn.diagnostics = self
+
+    def opened(self, cursor):
+        # 任务中执行的语句登记在当前线程，任务结束时仍未取完的也在那时结束
+        state = self.local
+        if hasattr(state, 'cursors') and not getattr(state, 'explaining', False):
+            state.cursors.append(cursor)
+
+    def finished(self, cursor, sql, parameters, ms):
+        state = self.local
+        if not hasattr(state, 'slow') or getattr(state, 'explaining', False):
+            return
+        if cursor in state.cursors:
+            state.cursors.remove(cursor)
+        # 语句按类型（SELECT、INSERT……）分别统计
+        self.record('sql.' + (sql.split(None, 1) or ['?'])[0].upper(), ms)
+        if ms > SLOW_QUERY_MS:
+            state.slow.append((sql, parameters, ms))
+
+    def run_task(self, name, fn, store, args, queued=None):
+        # 由 DatabaseExecutor、SearchEngine 在工作线程中调用，代替直接执行任务函数
+        state = self.local
+        state.cursors = []
+        state.slow = []
+        result = None
+        started = time.perf_counter()
+        try:
+            result = fn(store, *args)
+            return result
+        finally:
+            finished = time.perf_counter()
+            for cursor in list(state.cursors):
+                cursor.finish()
+            self.record(f'db.{name}', (finished - started) * 1000, row_count(result))
+            if queued is not None:
+                self.record(f'queue.{name}', (started - queued) * 1000)
+            for sql, parameters, statement_ms in state.slow:
+                self.slow_query(store.conn, name, sql, parameters, statement_ms)
+
+    def slow_query(self, conn, task, sql, parameters, ms):
+        # parameters 为 None 时（executemany 的参数不是列表）没有可用的绑定，不取执行计划
+        plan = []
+        if parameters is not None and sql.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')):
+            self.local.explaining = True
+            try:
+                plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, parameters)]
+            except Exception as e:
+                plan = [f'EXPLAIN 失败：{e}']
+            finally:
+                self.local.explaining = False
+        entry = {'time': datetime.now().strftime('%H:%M:%S'), 'task': task, 'ms': round(ms, 2),
+                 'sql': ' '.join(sql.split()), 'plan': plan}
+        with self.lock:
+            self.slow.append(entry)
+        self.log('slow_query', **entry)
+
+    def callback(self, name, fn, result):
+        # 由 DatabaseExecutor 在界面线程中调用任务的回调
+        started = time.perf_counter()
+        try:
+            fn(result)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            self.record(f'ui.{name}.callback', ms)
+            if ms > SLOW_HANDLER_MS:
+                self.log('slow_handler', name=f'{name}.callback', ms=round(ms, 2))
+
+    # 汇总
+
+    def snapshot(self):
+        with self.lock:
+            return ({name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                    list(self.slow))
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.slow.clear()
+
+    def close(self):
+        if self.logger is not None:
+            self.log('summary', histograms=self.snapshot()[0])
+            for handler in list(self.logger.handlers):
+                handler.close()
+                self.logger.removeHandler(handler)
+
+
+class DiagnosticsWindow:
+    def __init__(self, root, diagnostics):
+        self.diagnostics = diagnostics
+        self.window = tk.Toplevel(root)
+        self.window.title("诊断")
+        self.window.geometry("900x500")
+
+        btn_frame = ttk.Frame(self.window)
+        btn_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(btn_frame, text="清零", command=self.reset).pack(side=tk.LEFT)
+
+        panes = ttk.PanedWindow(self.window, orient=tk.VERTICAL)
+        panes.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        columns = ('count', 'avg', 'p50', 'p95', 'max', 'rows')
+        self.stats = ttk.Treeview(panes, columns=columns)
+        self.stats.heading('#0', text='名称')
+        self.stats.column('#0', width=260)
+        for column, text in zip(columns, ('次数', '平均(ms)', 'P50(ms)', 'P95(ms)', '最大(ms)', '行数')):
+            self.stats.heading(column, text=text)
+            self.stats.column(column, width=80, anchor=tk.E)
+        panes.add(self.stats, weight=2)
+
+        slow_frame = ttk.Frame(panes)
+        self.slow = ttk.Treeview(slow_frame, columns=('time', 'ms', 'task', 'sql'), show='headings', height=6)
+        for column, text, width in (('time', '时间', 70), ('ms', '耗时(ms)', 70), ('task', '任务', 160),
+                                    ('sql', '语句', 500)):
+            self.slow.heading(column, text=text)
+            self.slow.column(column, width=width)
+        self.slow.pack(fill=tk.BOTH, expand=True)
+        self.plan = tk.Text(slow_frame, height=5)
+        self.plan.pack(fill=tk.X)
+        self.slow.bind('<<TreeviewSelect>>', lambda e: self.show_plan())
+        panes.add(slow_frame, weight=1)
+
+        self.entries = []
+        self.refresh()
+
+    def reset(self):
+        self.diagnostics.reset()
+        self.refresh()
+
+    def refresh(self):
+        if not self.window.winfo_exists():
+            return
+        histograms, self.entries = self.diagnostics.snapshot()
+        self.stats.delete(*self.stats.get_children())
+        for name, summary in histograms.items():
+            self.stats.insert('', tk.END, text=name, values=(
+                summary['count'], summary['avg_ms'], summary['p50_ms'], summary['p95_ms'],
+                summary['max_ms'], summary['rows']))
+        selected = self.slow.selection()
+        self.slow.delete(*self.slow.get_children())
+        for index, entry in enumerate(reversed(self.entries)):
+            self.slow.insert('', tk.END, iid=str(index), values=(entry['time'], entry['ms'], entry['task'], entry['sql']))
+        self.slow.selection_set([iid for iid in selected if self.slow.exists(iid)])
+        self.window.after(WINDOW_REFRESH, self.refresh)
+
+    def show_plan(self):
+        self.plan.delete('1.0', tk.END)
+        selected = self.slow.selection()
+        if selected:
+            entry = list(reversed(self.entries))[int(selected[0])]
+            self.plan.insert('1.0', entry['sql'] + '\n\n' + '\n'.join(entry['plan']))
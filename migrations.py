@@ -0,0 +1,433 @@
+"""数据库结构迁移。
+
+schedule.py 与 scheduleupdate.py 共用同一套迁移；当前版本记录在 PRAGMA user_version 中，
+启动时在一个事务里依次执行尚未应用的迁移，已是最新版本时只需读取一次版本号。
+"""
+import re
+import sqlite3
+from datetime import datetime
+
+DUE_PATTERN = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{1,2})$', re.ASCII)
+
+
+def normalize_due(date, time):
+    # 统一为 'YYYY-MM-DD HH:MM'，使到期时间可以直接按字符串比较和索引；
+    # 接受的格式与 strptime('%Y-%m-%d %H:%M') 相同，但批量导入时快得多
+    match = DUE_PATTERN.match(f'{date} {time}')
+    if not match:
+        return None
+    year, month, day, hour, minute = map(int, match.groups())
+    try:
+        datetime(year, month, day, hour, minute)
+    except ValueError:
+        return None
+    return f'{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}'
+
+
+def table_columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+
+def create_schedules(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            description TEXT,
+            priority TEXT DEFAULT '普通',
+            status TEXT DEFAULT '未完成',
+            category TEXT DEFAULT '默认',
+            reminder INTEGER DEFAULT 0,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def add_category_and_reminder(cursor):
+    # scheduleupdate.py 创建的数据库没有这两列
+    columns = table_columns(cursor, 'schedules')
+    if 'category' not in columns:
+        cursor.execute("ALTER TABLE schedules ADD COLUMN category TEXT DEFAULT '默认'")
+    if 'reminder' not in columns:
+        cursor.execute('ALTER TABLE schedules ADD COLUMN reminder INTEGER DEFAULT 0')
+
+
+DUE_AT_UPDATE_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS schedules_due_at_update
+    AFTER UPDATE OF date, time ON schedules
+    BEGIN
+        UPDATE schedules
+        SET due_at = strftime('%Y-%m-%d %H:%M', new.date || ' ' || new.time), notified = 0
+        WHERE id = new.id;
+    END
+'''
+
+
+def add_due_at(cursor):
+    columns = table_columns(cursor, 'schedules')
+    if 'due_at' not in columns:
+        cursor.execute('ALTER TABLE schedules ADD COLUMN due_at TEXT')
+    if 'notified' not in columns:
+        cursor.execute('ALTER TABLE schedules ADD COLUMN notified INTEGER DEFAULT 0')
+
+    # 补齐已有数据的规范化到期时间
+    cursor.execute('SELECT id, date, time FROM schedules WHERE due_at IS NULL')
+    updates = [(normalize_due(date, time), schedule_id) for schedule_id, date, time in cursor.fetchall()]
+    cursor.executemany('UPDATE schedules SET due_at = ? WHERE id = ?', updates)
+
+    # 其他程序只写 date/time 时由触发器补上到期时间；修改时间后重新提醒
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS schedules_due_at_insert
+        AFTER INSERT ON schedules WHEN new.due_at IS NULL
+        BEGIN
+            UPDATE schedules SET due_at = strftime('%Y-%m-%d %H:%M', new.date || ' ' || new.time)
+            WHERE id = new.id;
+        END
+    ''')
+    cursor.execute(DUE_AT_UPDATE_TRIGGER)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_schedules_reminder_due
+        ON schedules (due_at)
+        WHERE reminder = 1 AND status = '未完成'
+    ''')
+
+
+def add_list_indexes(cursor):
+    # 对应列表的 ORDER BY date, time（以及作为键集分页末位的 rowid）、分类筛选和状态查询
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_date_time ON schedules (date, time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_category_date_time ON schedules (category, date, time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_status_date_time ON schedules (status, date, time)')
+
+
+# 标题和描述的全文索引（外部内容表），由触发器与 schedules 保持同步
+FTS_SCHEMA = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS schedules_fts USING fts5(
+        title, description,
+        content='schedules', content_rowid='id',
+        tokenize='trigram'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS schedules_fts_insert AFTER INSERT ON schedules BEGIN
+        INSERT INTO schedules_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS schedules_fts_delete AFTER DELETE ON schedules BEGIN
+        INSERT INTO schedules_fts(schedules_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS schedules_fts_update AFTER UPDATE OF title, description ON schedules BEGIN
+        INSERT INTO schedules_fts(schedules_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO schedules_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    ''',
+]
+
+
+FTS_INSERT_TRIGGER = FTS_SCHEMA[1]
+
+
+def has_fts(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schedules_fts'")
+    return cursor.fetchone() is not None
+
+
+def add_fts_index(cursor):
+    # 旧版 SQLite 不支持 FTS5 或 trigram 分词器时跳过，搜索退回 LIKE
+    exists = has_fts(cursor)
+    try:
+        cursor.execute(FTS_SCHEMA[0])
+    except sqlite3.OperationalError:
+        return
+    for statement in FTS_SCHEMA[1:]:
+        cursor.execute(statement)
+    if not exists:
+        # 为已有数据补建索引
+        cursor.execute("INSERT INTO schedules_fts(schedules_fts) VALUES ('rebuild')")
+
+
+# 重复日程跳过的日期，以逗号分隔（在 FROM schedules 的查询中使用）
+EXCEPTIONS_COLUMN = '''(
+    SELECT group_concat(date, ',') FROM schedule_exceptions WHERE schedule_id = schedules.id
+)'''
+
+
+def add_recurrence(cursor):
+    # 重复日程只保存一行规则（rrule 为空表示一次性日程），跳过的日期单独保存
+    if 'rrule' not in table_columns(cursor, 'schedules'):
+        cursor.execute('ALTER TABLE schedules ADD COLUMN rrule TEXT')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_schedules_recurring
+        ON schedules (date)
+        WHERE rrule IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schedule_exceptions (
+            schedule_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            PRIMARY KEY (schedule_id, date)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS schedules_exceptions_delete
+        AFTER DELETE ON schedules WHEN old.rrule IS NOT NULL
+        BEGIN
+            DELETE FROM schedule_exceptions WHERE schedule_id = old.id;
+        END
+    ''')
+
+
+def normalize_dates(cursor):
+    # 早期版本写入的日期、时间可能没有补零（如 2024-5-6 9:30），按 due_at 统一后
+    # 日历可以直接在 date 上做范围查询；修改期间暂停会重置提醒状态的触发器
+    cursor.execute('DROP TRIGGER IF EXISTS schedules_due_at_update')
+    cursor.execute('''
+        UPDATE schedules
+        SET date = substr(due_at, 1, 10), time = substr(due_at, 12)
+        WHERE rrule IS NULL AND due_at IS NOT NULL
+          AND (date != substr(due_at, 1, 10) OR time != substr(due_at, 12))
+    ''')
+    cursor.execute(DUE_AT_UPDATE_TRIGGER)
+
+
+# 每天的日程数、未完成数和未完成的高优先级数，供日历月视图使用；
+# 只统计一次性日程（重复日程按窗口展开后再计入），由触发器增量维护
+DAY_STATS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS day_stats (
+        date TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0,
+        pending INTEGER NOT NULL DEFAULT 0,
+        high INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS day_stats_insert
+    AFTER INSERT ON schedules WHEN new.rrule IS NULL
+    BEGIN
+        INSERT INTO day_stats (date, total, pending, high)
+        VALUES (new.date, 1, new.status = '未完成', new.status = '未完成' AND new.priority = '高')
+        ON CONFLICT (date) DO UPDATE SET
+            total = total + 1, pending = pending + excluded.pending, high = high + excluded.high;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS day_stats_delete
+    AFTER DELETE ON schedules WHEN old.rrule IS NULL
+    BEGIN
+        UPDATE day_stats
+        SET total = total - 1,
+            pending = pending - (old.status = '未完成'),
+            high = high - (old.status = '未完成' AND old.priority = '高')
+        WHERE date = old.date;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS day_stats_update
+    AFTER UPDATE OF date, status, priority, rrule ON schedules
+    BEGIN
+        UPDATE day_stats
+        SET total = total - 1,
+            pending = pending - (old.status = '未完成'),
+            high = high - (old.status = '未完成' AND old.priority = '高')
+        WHERE date = old.date AND old.rrule IS NULL;
+        INSERT INTO day_stats (date, total, pending, high)
+        SELECT new.date, 1, new.status = '未完成', new.status = '未完成' AND new.priority = '高'
+        WHERE new.rrule IS NULL
+        ON CONFLICT (date) DO UPDATE SET
+            total = total + 1, pending = pending + excluded.pending, high = high + excluded.high;
+    END
+    ''',
+]
+
+DAY_STATS_INSERT_TRIGGER = DAY_STATS_SCHEMA[1]
+
+# 按日期汇总 id > ? 的新行并累加到 day_stats
+DAY_STATS_BULK_INSERT = '''
+    INSERT INTO day_stats (date, total, pending, high)
+    SELECT date, COUNT(*), SUM(status = '未完成'), SUM(status = '未完成' AND priority = '高')
+    FROM schedules
+    WHERE id > ? AND rrule IS NULL
+    GROUP BY date
+    ON CONFLICT (date) DO UPDATE SET
+        total = total + excluded.total, pending = pending + excluded.pending, high = high + excluded.high
+'''
+
+
+def add_day_stats(cursor):
+    for statement in DAY_STATS_SCHEMA:
+        cursor.execute(statement)
+    cursor.execute('DELETE FROM day_stats')
+    cursor.execute(DAY_STATS_BULK_INSERT, (0,))
+
+
+# 日程开始、结束时间以分钟（Unix 时间 / 60）表示；没有时长的日程按 1 分钟计
+START_MINUTE = "CAST(strftime('%s', {0}.date || ' ' || {0}.time) AS INTEGER) / 60"
+END_MINUTE = START_MINUTE + ' + COALESCE({0}.duration, 1)'
+
+# 未完成的一次性日程的时间区间索引（一维 R*Tree），用于冲突检测和查找空闲时间；
+# 重复日程只有一行规则，查询时按窗口展开
+INTERVAL_SCHEMA = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS schedule_intervals USING rtree_i32(id, start_minute, end_minute)',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS schedule_intervals_insert
+    AFTER INSERT ON schedules WHEN new.rrule IS NULL AND new.status = '未完成'
+    BEGIN
+        INSERT INTO schedule_intervals (id, start_minute, end_minute)
+        SELECT new.id, {START_MINUTE.format('new')}, {END_MINUTE.format('new')}
+        WHERE {START_MINUTE.format('new')} IS NOT NULL;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS schedule_intervals_delete
+    AFTER DELETE ON schedules
+    BEGIN
+        DELETE FROM schedule_intervals WHERE id = old.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS schedule_intervals_update
+    AFTER UPDATE OF date, time, duration, status, rrule ON schedules
+    BEGIN
+        DELETE FROM schedule_intervals WHERE id = old.id;
+        INSERT INTO schedule_intervals (id, start_minute, end_minute)
+        SELECT new.id, {START_MINUTE.format('new')}, {END_MINUTE.format('new')}
+        WHERE new.rrule IS NULL AND new.status = '未完成' AND {START_MINUTE.format('new')} IS NOT NULL;
+    END
+    ''',
+]
+
+INTERVAL_INSERT_TRIGGER = INTERVAL_SCHEMA[1]
+
+INTERVAL_BULK_INSERT = f'''
+    INSERT INTO schedule_intervals (id, start_minute, end_minute)
+    SELECT id, {START_MINUTE.format('schedules')}, {END_MINUTE.format('schedules')}
+    FROM schedules
+    WHERE id > ? AND rrule IS NULL AND status = '未完成' AND {START_MINUTE.format('schedules')} IS NOT NULL
+'''
+
+
+def has_intervals(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schedule_intervals'")
+    return cursor.fetchone() is not None
+
+
+def add_duration(cursor):
+    # 可选的时长（分钟）；SQLite 未编译 R*Tree 模块时跳过区间索引，冲突检测退回按日期范围扫描
+    if 'duration' not in table_columns(cursor, 'schedules'):
+        cursor.execute('ALTER TABLE schedules ADD COLUMN duration INTEGER')
+    try:
+        cursor.execute(INTERVAL_SCHEMA[0])
+    except sqlite3.OperationalError:
+        return
+    for statement in INTERVAL_SCHEMA[1:]:
+        cursor.execute(statement)
+    cursor.execute('DELETE FROM schedule_intervals')
+    cursor.execute(INTERVAL_BULK_INSERT, (0,))
+
+
+def add_sort_keys(cursor):
+    # 优先级和状态的整数排序键（虚拟生成列，不占存储、写入时无需维护），
+    # 以及列表按各列排序时使用的索引；索引末尾隐含的 rowid 使顺序唯一，可用于键集分页
+    columns = {row[1] for row in cursor.execute('PRAGMA table_xinfo(schedules)').fetchall()}
+    if 'priority_rank' not in columns:
+        cursor.execute('''
+            ALTER TABLE schedules ADD COLUMN priority_rank INTEGER GENERATED ALWAYS AS (
+                CASE priority WHEN '高' THEN 0 WHEN '普通' THEN 1 WHEN '低' THEN 2 ELSE 3 END
+            ) VIRTUAL
+        ''')
+    if 'status_rank' not in columns:
+        cursor.execute('''
+            ALTER TABLE schedules ADD COLUMN status_rank INTEGER GENERATED ALWAYS AS (
+                CASE status WHEN '未完成' THEN 0 WHEN '已完成' THEN 1 ELSE 2 END
+            ) VIRTUAL
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_priority_sort ON schedules (priority_rank, date, time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_status_sort ON schedules (status_rank, date, time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_title_sort ON schedules (title, date, time)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_schedules_time_sort ON schedules (time, date)')
+
+
+# 批量写入时暂停的逐行插入触发器：(名称, 创建语句, 为 id > ? 的新行一次性补齐的语句)
+BULK_INSERT_TRIGGERS = [
+    ('schedules_fts_insert', FTS_INSERT_TRIGGER, '''
+        INSERT INTO schedules_fts(rowid, title, description)
+        SELECT id, title, description FROM schedules WHERE id > ?
+    '''),
+    ('day_stats_insert', DAY_STATS_INSERT_TRIGGER, DAY_STATS_BULK_INSERT),
+    ('schedule_intervals_insert', INTERVAL_INSERT_TRIGGER, INTERVAL_BULK_INSERT),
+]
+
+
+def suspend_insert_triggers(cursor):
+    # 在事务内删除存在的插入触发器并返回它们，写完后交给 resume_insert_triggers；
+    # 其他连接看不到中间状态
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    existing = {row[0] for row in cursor.fetchall()}
+    suspended = [trigger for trigger in BULK_INSERT_TRIGGERS if trigger[0] in existing]
+    for name, create, bulk in suspended:
+        cursor.execute(f'DROP TRIGGER {name}')
+    return suspended
+
+
+def resume_insert_triggers(cursor, suspended, last_id):
+    for name, create, bulk in suspended:
+        cursor.execute(bulk, (last_id,))
+        cursor.execute(create)
+
+
+# 按顺序追加，已发布的迁移不要修改；user_version 即已应用的迁移数量
+MIGRATIONS = [
+    create_schedules,
+    add_category_and_reminder,
+    add_due_at,
+    add_list_indexes,
+    add_fts_index,
+    add_recurrence,
+    normalize_dates,
+    add_day_stats,
+    add_duration,
+    add_sort_keys,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA user_version')
+    if cursor.fetchone()[0] >= SCHEMA_VERSION:
+        return
+
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # 拿到写锁后重新读取，另一个实例可能已经完成了迁移
+            cursor.execute('PRAGMA user_version')
+            version = cursor.fetchone()[0]
+            for migration in MIGRATIONS[version:]:
+                migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {max(version, SCHEMA_VERSION)}')
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+    finally:
+        conn.isolation_level = isolation_level
+
+
+def rebuild_fts_index(conn):
+    conn.execute("INSERT INTO schedules_fts(schedules_fts) VALUES ('rebuild')")
+    conn.commit()
@@ -0,0 +1,13 @@
+"""数据文件的默认位置。
+
+再次启动时的单实例检查在导入 tkinter 和数据库模块之前就需要数据目录，因此这里只依赖 os。
+"""
+import os
+
+
+def default_db_path():
+    # 图形界面和命令行默认使用用户文档文件夹中的数据库
+    documents_path = os.path.join(os.path.expanduser('~'), 'Documents', 'ScheduleManager')
+    if not os.path.exists(documents_path):
+        os.makedirs(documents_path)
+    return os.path.join(documents_path, 'schedule.db')
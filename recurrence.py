@@ -0,0 +1,175 @@
+"""重复日程的规则解析与展开。
+
+规则使用 RFC 5545 RRULE 的一个子集：FREQ=DAILY/WEEKLY/MONTHLY/YEARLY，
+以及 INTERVAL、BYDAY（仅 WEEKLY）、BYMONTHDAY（仅 MONTHLY）、COUNT、UNTIL。
+每条重复日程在数据库中只保存一行规则，显示或提醒时才按需要的时间窗口展开；
+展开结果按窗口缓存在有界的 LRU 缓存中。时间均为 'YYYY-MM-DD HH:MM' 文本。
+"""
+import calendar
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+EXPANSION_CACHE = 1024  # 最多缓存的 (规则, 窗口) 展开结果数
+MAX_MISSES = 100        # 连续这么多个周期都没有这一天时（如每 12 个月的 31 日遇上 4 月）认为规则不会再发生
+
+# 界面中可选的常用规则
+PRESETS = {
+    '不重复': None,
+    '每天': 'FREQ=DAILY',
+    '工作日': 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+    '每周': 'FREQ=WEEKLY',
+    '每月': 'FREQ=MONTHLY',
+    '每年': 'FREQ=YEARLY',
+}
+
+Rule = namedtuple('Rule', 'freq interval byday bymonthday count until')
+
+
+def parse_until(value):
+    # UNTIL 可以是日期（当天结束前都有效）或日期时间
+    if 'T' in value:
+        return datetime.strptime(value.rstrip('Z')[:15], '%Y%m%dT%H%M%S')
+    return datetime.strptime(value, '%Y%m%d') + timedelta(days=1, microseconds=-1)
+
+
+@lru_cache(maxsize=256)
+def parse_rule(text):
+    parts = {}
+    for item in text.upper().replace(' ', '').split(';'):
+        if not item:
+            continue
+        name, sep, value = item.partition('=')
+        if not sep or not value:
+            raise ValueError(f"重复规则格式不正确：{item}")
+        parts[name] = value
+
+    unknown = set(parts) - {'FREQ', 'INTERVAL', 'BYDAY', 'BYMONTHDAY', 'COUNT', 'UNTIL'}
+    if unknown:
+        raise ValueError(f"不支持的重复规则项：{'、'.join(sorted(unknown))}")
+    freq = parts.get('FREQ')
+    if freq not in FREQUENCIES:
+        raise ValueError("重复频率只能是 DAILY、WEEKLY、MONTHLY 或 YEARLY")
+
+    interval = int(parts.get('INTERVAL', 1))
+    byday = ()
+    if 'BYDAY' in parts:
+        if freq != 'WEEKLY':
+            raise ValueError("BYDAY 只能用于 WEEKLY")
+        if any(day not in WEEKDAYS for day in parts['BYDAY'].split(',')):
+            raise ValueError(f"星期格式不正确：{parts['BYDAY']}")
+        byday = tuple(sorted({WEEKDAYS.index(day) for day in parts['BYDAY'].split(',')}))
+    bymonthday = None
+    if 'BYMONTHDAY' in parts:
+        if freq != 'MONTHLY':
+            raise ValueError("BYMONTHDAY 只能用于 MONTHLY")
+        bymonthday = int(parts['BYMONTHDAY'])
+        if not 1 <= bymonthday <= 31:
+            raise ValueError("BYMONTHDAY 应在 1~31 之间")
+    count = int(parts['COUNT']) if 'COUNT' in parts else None
+    until = parse_until(parts['UNTIL']) if 'UNTIL' in parts else None
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError("INTERVAL 和 COUNT 应为正整数")
+    return Rule(freq, interval, byday, bymonthday, count, until)
+
+
+def add_months(year, month, months):
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def iter_candidates(rule, start, after):
+    # 按时间顺序生成 (序号, 发生时间)，序号从 0 开始计数，用于 COUNT；
+    # 没有 COUNT 限制时直接跳到 after 附近，不从首次发生时间逐个推算
+    if rule.freq == 'DAILY':
+        step = timedelta(days=rule.interval)
+        k = 0
+        if after > start:
+            k = -((start - after) // step)
+        while True:
+            yield k, start + k * step
+            k += 1
+
+    elif rule.freq == 'WEEKLY':
+        days = rule.byday or (start.weekday(),)
+        monday = start - timedelta(days=start.weekday())
+        first_week = sum(1 for day in days if day >= start.weekday())
+        week = 0
+        if after > start:
+            week = (after - monday).days // 7 // rule.interval * rule.interval
+        while True:
+            n = 0 if week == 0 else first_week + (week // rule.interval - 1) * len(days)
+            for day in days:
+                moment = monday + timedelta(days=week * 7 + day)
+                if moment >= start:
+                    yield n, moment
+                    n += 1
+            week += rule.interval
+
+    else:
+        step = rule.interval * (12 if rule.freq == 'YEARLY' else 1)
+        day = rule.bymonthday or start.day
+        months = 0
+        if rule.count is None and after > start:
+            months = ((after.year - start.year) * 12 + after.month - start.month) // step * step
+        n = 0
+        misses = 0
+        while misses < MAX_MISSES:
+            year, month = add_months(start.year, start.month, months)
+            # 当月没有这一天（如 31 日、2 月 29 日）时跳过，与 RFC 5545 一致
+            if day <= calendar.monthrange(year, month)[1]:
+                misses = 0
+                moment = start.replace(year=year, month=month, day=day)
+                if moment >= start:
+                    yield n, moment
+                    n += 1
+            else:
+                misses += 1
+            months += step
+
+
+def iter_occurrences(rule, start, after=None):
+    # 生成不早于 after 的发生时间（datetime）
+    after = after or start
+    for n, moment in iter_candidates(rule, start, after):
+        if rule.count is not None and n >= rule.count:
+            return
+        if rule.until is not None and moment > rule.until:
+            return
+        if moment >= after:
+            yield moment
+
+
+def to_datetime(text):
+    return datetime.strptime(text, '%Y-%m-%d %H:%M')
+
+
+@lru_cache(maxsize=EXPANSION_CACHE)
+def expand(rrule, start, window_start, window_end, exdates=()):
+    """返回 [window_start, window_end) 内的发生时间。
+
+    参数都是可哈希的文本（exdates 为跳过日期的元组），结果按参数缓存；
+    规则、首次时间或例外日期改变时缓存键随之改变，不会取到过期的结果。
+    """
+    rule = parse_rule(rrule)
+    end = to_datetime(window_end)
+    occurrences = []
+    for moment in iter_occurrences(rule, to_datetime(start), to_datetime(window_start)):
+        if moment >= end:
+            break
+        text = moment.strftime('%Y-%m-%d %H:%M')
+        if text[:10] not in exdates:
+            occurrences.append(text)
+    return tuple(occurrences)
+
+
+def next_occurrence(rrule, start, after, exdates=()):
+    # 严格晚于 after 的下一次发生时间；after 为 None 时返回首次发生时间，没有时返回 None
+    after_time = to_datetime(after) + timedelta(minutes=1) if after else None
+    for moment in iter_occurrences(parse_rule(rrule), to_datetime(start), after_time):
+        text = moment.strftime('%Y-%m-%d %H:%M')
+        if text[:10] not in exdates:
+            return text
+    return None
@@ -1,57 +1,490 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import sqlite3
-from datetime import datetime
+# 启动时间线以主模块开始执行的时刻为起点，需在其他导入之前取得
+from time import perf_counter
+STARTED = perf_counter()
+
 import os
-import csv
+import sys
+
+if __name__ == '__main__' and not {'--new-window', '--rebuild-fts'} & set(sys.argv[1:]):
+    # 已有窗口在运行时把本次启动转交给它后退出，不再导入 tkinter、打开数据库
+    import single_instance
+    from paths import default_db_path
+    if single_instance.forward(os.path.dirname(default_db_path()), sys.argv[1:]):
+        sys.exit(0)
+
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from datetime import datetime, timedelta
+from bisect import bisect_left, insort
+import heapq
+import queue
+import threading
+
+from migrations import normalize_due
+import schedule_io
+from paths import default_db_path
+from schedule_store import (ScheduleStore, ListOrder, DEFAULT_ORDER, LIST_COLUMNS, first_due, duration_between,
+                            key_values)
+import recurrence
+import archive
+from db_worker import DatabaseExecutor
+from startup_trace import StartupTimeline, trace_target
+
+ROW_HEIGHT = 22      # 列表行高（像素）
+HEADER_HEIGHT = 26   # 列表表头高度（像素）
+OVERSCAN = 3         # 可见区域之外额外生成的行数
+PAGE_SIZE = 100      # 按键集分页每次读取的行数
+MAX_BUFFER = 1000    # 内存中最多缓存的行数
+
+SEARCH_DELAY = 250   # 搜索输入防抖时间（毫秒）
+SEARCH_POLL = 20     # 检查后台搜索结果的间隔（毫秒）
+NARROW_LIMIT = 50000 # 结果集不超过该行数时缓存在内存中，供后续输入直接收窄
+MAX_REMINDER_DELAY = 3600 * 1000  # 提醒定时器的最长等待时间（毫秒），防止系统时间变化后错过提醒
+
+CATEGORIES = ('默认', '工作', '学习', '生活', '其他')
+DIAGNOSTICS_ENV = 'SCHEDULE_DIAGNOSTICS'
+# 开启诊断时记录耗时的界面处理函数
+INSTRUMENTED_HANDLERS = ('refresh_list', 'apply_filter', 'add_schedule', 'mark_complete', 'delete_schedule',
+                         'change_category', 'export_schedules', 'import_schedules', 'render_window')
+TIMELINE = StartupTimeline(STARTED)
+TIMELINE.mark('import')
+FREE_SLOT_DAYS = 14  # 查找空闲时间的天数
+DEFAULT_DURATION = 60  # 没有填写结束时间时查找空闲时间使用的时长（分钟）
+ARCHIVE_DELAY = 60 * 1000         # 启动后开始第一次归档的时间（毫秒），不与首屏加载争用
+ARCHIVE_PAUSE = 200               # 两批归档之间的间隔（毫秒），其间界面的写操作可以先执行
+ARCHIVE_INTERVAL = 3600 * 1000    # 之后每隔多久检查一次可归档的日程（毫秒）
+BACKUP_DELAY = 5 * 60 * 1000      # 启动后第一次备份的时间（毫秒）
+BACKUP_INTERVAL = 3600 * 1000     # 之后每隔多久备份一次（毫秒），没有修改时跳过
+CHANGE_POLL = 1000   # 检查其他窗口或程序是否修改了数据库的间隔（毫秒）
+INSTANCE_POLL = 250  # 检查是否有再次启动转交过来的间隔（毫秒）
+
+
+
+class ReminderScheduler:
+    """按到期时间排列的提醒队列。
+
+    未提醒的日程保存在最小堆中，只为最早到期的一条设置一个定时器；
+    提醒前先在写线程中认领（一次性日程把 notified 置为 1，重复日程顺延 due_at），
+    保证每次发生只提醒一次。
+    """
+
+    def __init__(self, db, schedule, cancel, notify):
+        self.db = db
+        self.schedule = schedule  # schedule(delay_ms) -> timer_id
+        self.cancel = cancel
+        self.notify = notify      # notify(rows)，rows 为到期日程的 (title, date, time)
+        self.heap = []
+        self.timer = None
+
+    def load(self):
+        self.db.read(ScheduleStore.pending_reminders, callback=self.loaded)
+
+    def reload(self):
+        # 其他程序修改了数据库：整体替换队列
+        def reloaded(rows):
+            self.heap = list(rows)
+            heapq.heapify(self.heap)
+            self.arm()
+
+        self.db.read(ScheduleStore.pending_reminders, callback=reloaded)
+
+    def loaded(self, rows):
+        # 加载完成之前添加的提醒也保留；重复的条目在 claim_reminders 中去重
+        self.heap.extend(rows)
+        heapq.heapify(self.heap)
+        self.arm()
+
+    def add(self, schedule_id, due_at):
+        if due_at is None:
+            return
+        heapq.heappush(self.heap, (due_at, schedule_id))
+        if self.heap[0] == (due_at, schedule_id):
+            self.arm()
+
+    def arm(self):
+        if self.timer is not None:
+            self.cancel(self.timer)
+            self.timer = None
+        if not self.heap:
+            return
+        due = datetime.strptime(self.heap[0][0], '%Y-%m-%d %H:%M')
+        delay = int((due - datetime.now()).total_seconds() * 1000)
+        self.timer = self.schedule(max(0, min(delay, MAX_REMINDER_DELAY)))
+
+    def pop_due(self):
+        self.timer = None
+        now = datetime.now().strftime('%Y-%m-%d %H:%M')
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        self.arm()
+
+        if due:
+            self.db.write(ScheduleStore.claim_reminders, due, callback=self.notified)
+
+    def notified(self, result):
+        # 重复日程认领后顺延到下一次发生，重新加入队列
+        rows, rescheduled = result
+        for due_at, schedule_id in rescheduled:
+            self.add(schedule_id, due_at)
+        if rows:
+            self.notify(rows)
+
+
+def search_text(title, desc):
+    # 搜索时与搜索词比较的文本（小写），与 LIKE/trigram 的不区分大小写一致
+    return f'{title}\n{desc or ""}'.lower()
+
+
+class SearchEngine:
+    """在后台线程中执行增量搜索。
+
+    每次提交都会使之前尚未完成的搜索失效；若新搜索词包含上一次的搜索词，
+    则直接在上一次的结果集中收窄，而不是重新扫描整张表。
+    """
+
+    def __init__(self, db_path, diagnostics=None):
+        self.db_path = db_path
+        self.diagnostics = diagnostics
+        self.generation = 0
+        self.data_version = 0
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.cache = None  # (needle, category, order, include_archive, data_version, matches)，仅由工作线程访问
+        self.thread = None
+
+    def search(self, term, category, order=DEFAULT_ORDER, include_archive=False):
+        if self.thread is None:
+            # 第一次搜索时才启动搜索线程，不占用启动时间
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        self.generation += 1
+        self.jobs.put((self.generation, term, category, order, include_archive))
+        return self.generation
+
+    def cancel(self):
+        # 递增代数后，正在执行的查询会在进度回调中被中断
+        self.generation += 1
+
+    def invalidate(self):
+        # 数据发生变化，丢弃缓存的结果集
+        self.data_version += 1
+
+    def poll(self):
+        latest = None
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return latest
+            if result[0] == self.generation:
+                latest = result
+
+    def open_store(self):
+        if self.diagnostics is None:
+            return ScheduleStore(self.db_path)
+        store = ScheduleStore(self.db_path, self.diagnostics.connection_class)
+        self.diagnostics.attach(store.conn)
+        return store
+
+    def run(self):
+        store = None
+        while True:
+            generation, term, category, order, include_archive = self.jobs.get()
+            if generation != self.generation:
+                continue
+            try:
+                # 打开失败时下一次搜索重新尝试
+                if store is None:
+                    store = self.open_store()
+                if self.diagnostics is None:
+                    keys = self.find(store, generation, term, category, order, include_archive)
+                else:
+                    keys = self.diagnostics.run_task('SearchEngine.find', self.find, store,
+                                                     (generation, term, category, order, include_archive))
+            except Exception as e:
+                # 代数已变说明是被新的输入中断；否则（数据库被锁定、读取出错等）把错误交给界面
+                if generation == self.generation:
+                    self.results.put((generation, e))
+                continue
+            if keys is not None:
+                self.results.put((generation, term, category, order, keys))
+
+    def find(self, store, generation, term, category, order, include_archive=False):
+        needle = term.lower()
+        data_version = self.data_version
+        cache = self.cache
+
+        if cache and cache[0] in needle and cache[1:5] == (category, order, include_archive, data_version):
+            matches = []
+            for index, match in enumerate(cache[5]):
+                if index % 4096 == 0 and generation != self.generation:
+                    return None
+                if needle in match[1]:
+                    matches.append(match)
+        else:
+            store.conn.set_progress_handler(lambda: generation != self.generation, 10000)
+            try:
+                cursor = store.matches(term, category, order, include_archive)
+                matches = []
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    for row in rows:
+                        matches.append((order.wrap(row[:-2]), search_text(row[-2], row[-1])))
+            finally:
+                store.conn.set_progress_handler(None, 0)
+
+        if len(matches) <= NARROW_LIMIT:
+            self.cache = (needle, category, order, include_archive, data_version, matches)
+        else:
+            self.cache = None
+        return [match[0] for match in matches]
+
+
+class ScheduleListModel:
+    """列表当前结果集的视图模型。
+
+    结果集按 order（默认为 date, time, id）排序，内存中只保留可见区域附近的一段连续行；
+    搜索时另外持有全部匹配行的排序键。增删改在这里二分定位，
+    界面只需在对应位置做一次 Treeview 操作，不必重新加载整个列表。
+    模型本身不访问数据库：missing 给出还缺少的一页，由读线程通过 ScheduleStore.page
+    查询后交给 merge。
+    """
 
-class ScheduleManager:
     def __init__(self):
+        self.category = "全部"
+        self.search_term = ''
+        self.search_keys = None
+        self.order = DEFAULT_ORDER
+        self.filter = ('', [])
+        self.total = 0
+        self.buffer_start = 0
+        self.buffer = []
+        self.version = 0  # 结果集或行位置变化时递增，用于丢弃过期的查询结果
+
+    def row_key(self, row):
+        return self.order.key(row)
+
+    @staticmethod
+    def make_filter(category):
+        return schedule_io.build_filter('', category)
+
+    def reset(self, category, total, search_term='', search_keys=None, order=None):
+        self.category = category
+        if order is not None:
+            self.order = order
+        self.search_term = search_term
+        self.search_keys = search_keys
+        self.filter = self.make_filter(category)
+        self.total = len(search_keys) if search_keys is not None else total
+        self.buffer_start = 0
+        self.buffer = []
+        self.version += 1
+
+    def matches(self, row, haystack):
+        if self.category != "全部" and row[4] != self.category:
+            return False
+        return not self.search_term or self.search_term.lower() in haystack
+
+    def missing(self, start, end):
+        # 返回补齐 [start, end) 还需读取的一页 (kind, anchor, limit)，已全部缓存时返回 None
+        end = min(end, self.total)
+        if end <= start:
+            return None
+        buffer_end = self.buffer_start + len(self.buffer)
+
+        if not self.buffer or end < self.buffer_start - PAGE_SIZE or start > buffer_end + PAGE_SIZE:
+            # 远距离跳转：用 OFFSET 定位一次，之后顺序滚动都走键集分页
+            return ('offset', start, max(PAGE_SIZE, end - start))
+        if self.buffer_start > start:
+            return ('before', self.row_key(self.buffer[0]), PAGE_SIZE)
+        if buffer_end < end:
+            return ('after', self.row_key(self.buffer[-1]), PAGE_SIZE)
+        return None
+
+    def merge(self, request, rows, start):
+        # 把读线程返回的一页并入缓存；行数不足说明数据已被其他程序修改，据此修正总数
+        kind, anchor, limit = request
+        if kind == 'offset':
+            self.buffer = rows
+            self.buffer_start = anchor
+            if len(rows) < limit:
+                self.total = min(self.total, anchor + len(rows))
+        elif kind == 'before':
+            self.buffer[:0] = rows
+            self.buffer_start = max(0, self.buffer_start - len(rows))
+            if len(rows) < limit:
+                self.buffer_start = 0
+        else:
+            self.buffer.extend(rows)
+            if len(rows) < limit:
+                self.total = self.buffer_start + len(self.buffer)
+        self.version += 1
+
+        # 缓存超出上限时丢弃离可见区域较远的一端
+        if len(self.buffer) > MAX_BUFFER:
+            if start - self.buffer_start > MAX_BUFFER // 2:
+                drop = min(start - self.buffer_start - PAGE_SIZE, len(self.buffer) - MAX_BUFFER)
+                del self.buffer[:drop]
+                self.buffer_start += drop
+            if len(self.buffer) > MAX_BUFFER:
+                del self.buffer[MAX_BUFFER:]
+
+    def window(self, start, end):
+        # 返回缓存中从 start 开始的连续行，可能少于 end - start 行
+        end = min(end, self.total)
+        if end <= start or not self.buffer_start <= start < self.buffer_start + len(self.buffer):
+            return []
+        return self.buffer[start - self.buffer_start:end - self.buffer_start]
+
+    def insert(self, row, haystack):
+        # 返回新行在结果集中的位置；-1 表示位于缓存之前，None 表示不符合当前筛选
+        if not self.matches(row, haystack):
+            return None
+
+        key = self.row_key(row)
+        if self.search_keys is not None:
+            insort(self.search_keys, key)
+        self.version += 1
+        loaded_after = self.buffer_start + len(self.buffer) < self.total
+        self.total += 1
+
+        index = bisect_left(self.buffer, key, key=self.row_key)
+        if index == 0 and self.buffer_start > 0:
+            # 缓存之前还有未加载的行，只需平移缓存的起始位置
+            self.buffer_start += 1
+            return -1
+        if index == len(self.buffer) and loaded_after:
+            # 缓存之后还有未加载的行，新行之后滚动到时再读取
+            return self.total - 1
+        self.buffer.insert(index, row)
+        return self.buffer_start + index
+
+    def remove(self, ids):
+        # 返回被删除行的位置；有行不在缓存中时无法定位，返回 None
+        ids = set(ids)
+        removed = [(self.buffer_start + index, row) for index, row in enumerate(self.buffer) if row[0] in ids]
+        if len(removed) != len(ids):
+            return None
+
+        self.buffer = [row for row in self.buffer if row[0] not in ids]
+        if self.search_keys is not None:
+            for position, row in reversed(removed):
+                index = bisect_left(self.search_keys, self.row_key(row))
+                if index < len(self.search_keys) and key_values(self.search_keys[index])[-1] == row[0]:
+                    del self.search_keys[index]
+        self.total -= len(removed)
+        self.version += 1
+        return [position for position, row in removed]
+
+    def update(self, ids, column, value):
+        # 只修改不影响当前排序的列（见 ListOrder.depends_on），返回缓存中被修改的行
+        index = LIST_COLUMNS.split(', ').index(column)
+        ids = set(ids)
+        updated = []
+        for position, row in enumerate(self.buffer):
+            if row[0] in ids:
+                row = row[:index] + (value,) + row[index + 1:]
+                self.buffer[position] = row
+                updated.append(row)
+        return updated
+
+
+class ScheduleManager:
+    def __init__(self, startup_trace=None, diagnostics=False, instance=None):
+        self.timeline = TIMELINE
+        self.startup_trace = startup_trace  # 启动时间线的输出位置，None 表示不输出
+        self.instance = instance  # single_instance.InstanceServer，为 None 时不接收转交的启动
         self.root = tk.Tk()
         self.root.title("个人日程管理 - By RyanZhao")
         self.root.geometry("1000x600")
         self.root.resizable(True, True)
         
-        # 修改数据库路径到用户文档文件夹
-        documents_path = os.path.join(os.path.expanduser('~'), 'Documents', 'ScheduleManager')
-        # 确保文件夹存在
-        if not os.path.exists(documents_path):
-            os.makedirs(documents_path)
-            
-        # 使用固定路径保存数据库
-        self.db_path = os.path.join(documents_path, 'schedule.db')
-        self.conn = sqlite3.connect(self.db_path)
-        self.create_table()
+        # 数据库保存在用户文档文件夹
+        self.db_path = default_db_path()
+        
+        # 可选的性能诊断，日志与数据库放在同一目录
+        self.diagnostics = None
+        self.diagnostics_window = None
+        if diagnostics:
+            from diagnostics import Diagnostics
+            self.diagnostics = Diagnostics(os.path.join(os.path.dirname(self.db_path), 'diagnostics.log'))
+            for name in INSTRUMENTED_HANDLERS:
+                setattr(self, name, self.diagnostics.timed(f'ui.{name}', getattr(self, name)))
+
+        # 所有查询和写入（包括启动时的结构迁移）都在后台线程中执行，结果通过 after 交回界面线程
+        self.db = DatabaseExecutor(self.open_store, self.root.after, observer=self.diagnostics)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
+        # 增量搜索
+        self.search_engine = SearchEngine(self.db_path, self.diagnostics)
+        
+        # 定期在线备份，在单独的线程和连接上进行；backup 只用于此，第一次备份时才导入并创建
+        self.backups = None
+        self.search_job = None
+        self.pending_search = None
+        self.pending_reset = False
+        self.list_generation = 0
+
+        # 虚拟列表：结果集由视图模型维护，界面只记录首个可见行和可见行数
+        self.model = ScheduleListModel()
+        self.order = DEFAULT_ORDER  # 点击表头选择的排序，由数据库按对应索引排序
+        self.view_offset = 0
+        self.visible_rows = 20
+        self.selected_ids = set()  # 选中的日程 id，包括已滚出可见区域的行
         
         # 设置主题色
         style = ttk.Style()
-        style.configure("Treeview", font=('微软雅黑', 9))
+        style.configure("Treeview", font=('微软雅黑', 9), rowheight=ROW_HEIGHT)
         style.configure("TButton", padding=5)
         
         # 创建界面
         self.create_gui()
         
-        # 启动定时检查提醒
-        self.check_reminders()
-        self.root.after(60000, self.check_reminders)  # 每分钟检查一次
-        
-    def create_table(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS schedules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                description TEXT,
-                priority TEXT DEFAULT '普通',
-                status TEXT DEFAULT '未完成',
-                category TEXT DEFAULT '默认',
-                reminder INTEGER DEFAULT 0,
-                create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        self.conn.commit()
+        # 启动提醒：只为最近到期的一条日程设置定时器
+        self.reminders = ReminderScheduler(
+            self.db,
+            lambda delay: self.root.after(delay, self.reminders.pop_due),
+            self.root.after_cancel,
+            self.show_reminders
+        )
+        if self.diagnostics is not None:
+            self.reminders.pop_due = self.diagnostics.timed('ui.check_reminders', self.reminders.pop_due)
+        self.timeline.mark('gui')
+        
+    def open_store(self):
+        # 在工作线程中调用；第一个完成的连接记入启动时间线
+        if self.diagnostics is None:
+            store = ScheduleStore(self.db_path)
+        else:
+            store = ScheduleStore(self.db_path, self.diagnostics.connection_class)
+            self.diagnostics.attach(store.conn)
+        for name, start, end in store.timings:
+            self.timeline.span(name, start, end)
+        return store
+        
+    def start(self):
+        # 窗口绘制完成后才开始读取列表和提醒，首屏不等待数据库
+        self.timeline.mark('first_paint')
+        self.load_list(reset_offset=True)
+        self.reminders.load()
+        self.root.after(ARCHIVE_DELAY, self.archive_step)
+        self.root.after(BACKUP_DELAY, self.backup_step)
+        self.watch_changes()
+        if self.instance is not None:
+            self.root.after(INSTANCE_POLL, self.poll_instance)
+        
+    def first_data(self):
+        if 'first_data' in self.timeline.events:
+            return
+        self.timeline.mark('first_data')
+        if self.startup_trace:
+            try:
+                self.timeline.write(self.startup_trace)
+            except OSError:
+                pass
         
     def create_gui(self):
         # 创建主框架
@@ -82,6 +515,11 @@ class ScheduleManager:
         self.time_entry = ttk.Entry(input_frame)
         self.time_entry.grid(row=2, column=1, padx=5, pady=5)
         self.time_entry.insert(0, datetime.now().strftime('%H:%M'))
+        end_frame = ttk.Frame(input_frame)
+        end_frame.grid(row=2, column=2, sticky=tk.W)
+        ttk.Label(end_frame, text="至").pack(side=tk.LEFT)
+        self.end_entry = ttk.Entry(end_frame, width=8)
+        self.end_entry.pack(side=tk.LEFT, padx=5)
         
         # 优先级
         ttk.Label(input_frame, text="优先级:").grid(row=3, column=0, sticky=tk.W, pady=5)
@@ -96,7 +534,7 @@ class ScheduleManager:
         ttk.Label(input_frame, text="分类:").grid(row=4, column=0, sticky=tk.W, pady=5)
         self.category_var = tk.StringVar(value="默认")
         self.category_combo = ttk.Combobox(input_frame, textvariable=self.category_var)
-        self.category_combo['values'] = ('默认', '工作', '学习', '生活', '其他')
+        self.category_combo['values'] = CATEGORIES
         self.category_combo.grid(row=4, column=1, padx=5, pady=5)
         
         # 提醒
@@ -104,16 +542,24 @@ class ScheduleManager:
         self.reminder_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(input_frame, text="开启提醒", variable=self.reminder_var).grid(row=5, column=1, padx=5, pady=5)
         
+        # 重复
+        ttk.Label(input_frame, text="重复:").grid(row=6, column=0, sticky=tk.W, pady=5)
+        self.repeat_var = tk.StringVar(value="不重复")
+        repeat_combo = ttk.Combobox(input_frame, textvariable=self.repeat_var, state='readonly')
+        repeat_combo['values'] = tuple(recurrence.PRESETS)
+        repeat_combo.grid(row=6, column=1, padx=5, pady=5)
+        
         # 描述
-        ttk.Label(input_frame, text="描述:").grid(row=6, column=0, sticky=tk.W+tk.N, pady=5)
+        ttk.Label(input_frame, text="描述:").grid(row=7, column=0, sticky=tk.W+tk.N, pady=5)
         self.desc_text = tk.Text(input_frame, height=10, width=40)
-        self.desc_text.grid(row=6, column=1, columnspan=2, padx=5, pady=5)
+        self.desc_text.grid(row=7, column=1, columnspan=2, padx=5, pady=5)
         
         # 按钮区域
         btn_frame = ttk.Frame(left_frame)
         btn_frame.pack(fill=tk.X, pady=10)
         ttk.Button(btn_frame, text="添加日程", command=self.add_schedule).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="清空输入", command=self.clear_inputs).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="查找空闲时间", command=self.find_free_slot).pack(side=tk.LEFT, padx=5)
         
         # 右侧日程列表区域
         right_frame = ttk.LabelFrame(main_frame, text="日程列表", padding=10)
@@ -126,26 +572,39 @@ class ScheduleManager:
         # 搜索框
         ttk.Label(filter_frame, text="搜索:").pack(side=tk.LEFT)
         self.search_var = tk.StringVar()
-        self.search_var.trace('w', lambda *args: self.refresh_list())
+        self.search_var.trace('w', lambda *args: self.on_search_changed())
         ttk.Entry(filter_frame, textvariable=self.search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        # 搜索和导出时是否包括已归档的日程
+        self.include_archive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame, text="含归档", variable=self.include_archive_var,
+                        command=self.apply_filter).pack(side=tk.LEFT)
         
         # 分类筛选
         ttk.Label(filter_frame, text="分类筛选:").pack(side=tk.LEFT, padx=5)
         self.filter_category_var = tk.StringVar(value="全部")
         filter_category_combo = ttk.Combobox(filter_frame, textvariable=self.filter_category_var, width=10)
-        filter_category_combo['values'] = ('全部', '默认', '工作', '学习', '生活', '其他')
+        filter_category_combo['values'] = ('全部',) + CATEGORIES
         filter_category_combo.pack(side=tk.LEFT)
-        filter_category_combo.bind('<<ComboboxSelected>>', lambda e: self.refresh_list())
+        filter_category_combo.bind('<<ComboboxSelected>>', lambda e: self.apply_filter())
+        
+        # 列表和日历两个标签页；日历在第一次切换过去时才创建
+        self.notebook = ttk.Notebook(right_frame)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+        list_frame = ttk.Frame(self.notebook)
+        self.notebook.add(list_frame, text="列表")
+        self.calendar = None
+        self.calendar_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.calendar_frame, text="日历")
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
         
         # 创建树形视图
         columns = ('title', 'date', 'time', 'category', 'priority', 'status')
-        self.tree = ttk.Treeview(right_frame, columns=columns, show='headings')
-        self.tree.heading('title', text='标题')
-        self.tree.heading('date', text='日期')
-        self.tree.heading('time', text='时间')
-        self.tree.heading('category', text='分类')
-        self.tree.heading('priority', text='优先级')
-        self.tree.heading('status', text='状态')
+        self.tree = ttk.Treeview(list_frame, columns=columns, show='headings')
+        self.headings = {'title': '标题', 'date': '日期', 'time': '时间', 'category': '分类',
+                         'priority': '优先级', 'status': '状态'}
+        for column in columns:
+            self.tree.heading(column, command=lambda column=column: self.sort_by(column))
+        self.show_sort()
         
         # 设置列宽
         self.tree.column('title', width=200)
@@ -155,30 +614,79 @@ class ScheduleManager:
         self.tree.column('priority', width=60)
         self.tree.column('status', width=60)
         
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(right_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # 添加滚动条（按总行数驱动，列表只生成可见区域的行）
+        self.scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.on_scrollbar)
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.tree.bind('<Configure>', self.on_tree_configure)
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', self.on_mousewheel)
+        self.tree.bind('<Button-5>', self.on_mousewheel)
+        self.tree.bind('<Prior>', lambda e: self.scroll_by(-self.visible_rows))
+        self.tree.bind('<Next>', lambda e: self.scroll_by(self.visible_rows))
+        self.tree.bind('<ButtonPress-1>', self.on_tree_click)
         
         # 操作按钮
         btn_frame = ttk.Frame(right_frame)
         btn_frame.pack(fill=tk.X, pady=5)
         ttk.Button(btn_frame, text="完成", command=self.mark_complete).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="删除", command=self.delete_schedule).pack(side=tk.LEFT, padx=5)
+        category_button = ttk.Menubutton(btn_frame, text="修改分类")
+        category_menu = tk.Menu(category_button, tearoff=0)
+        for category in CATEGORIES:
+            category_menu.add_command(label=category, command=lambda category=category: self.change_category(category))
+        category_button['menu'] = category_menu
+        category_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="刷新", command=self.refresh_list).pack(side=tk.LEFT, padx=5)
-        ttk.Button(btn_frame, text="导出数据", command=self.export_schedules).pack(side=tk.LEFT, padx=5)
+        export_button = ttk.Menubutton(btn_frame, text="导出数据")
+        export_menu = tk.Menu(export_button, tearoff=0)
+        for fmt, (label, extension) in schedule_io.EXPORT_FORMATS.items():
+            export_menu.add_command(label=f"{label} ({extension})", command=lambda fmt=fmt: self.export_schedules(fmt))
+        export_button['menu'] = export_menu
+        export_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="导入数据", command=self.import_schedules).pack(side=tk.LEFT, padx=5)
+        if self.diagnostics is not None:
+            ttk.Button(btn_frame, text="诊断", command=self.show_diagnostics).pack(side=tk.LEFT, padx=5)
         
-        self.refresh_list()
+        # 导出进度（仅在导出时显示）
+        self.export_running = False
+        self.export_progress = ttk.Progressbar(btn_frame, length=150, mode='determinate')
+        
+        # 状态栏：显示后台操作（如搜索）的失败信息
+        self.status_var = tk.StringVar()
+        ttk.Label(right_frame, textvariable=self.status_var, foreground='red').pack(fill=tk.X)
+        
+    def show_diagnostics(self):
+        from diagnostics import DiagnosticsWindow
+        if self.diagnostics_window is not None and self.diagnostics_window.window.winfo_exists():
+            self.diagnostics_window.window.lift()
+            return
+        self.diagnostics_window = DiagnosticsWindow(self.root, self.diagnostics)
+        
+    def on_tab_changed(self, event):
+        visible = self.notebook.select() == str(self.calendar_frame)
+        if visible and self.calendar is None:
+            from calendar_view import CalendarView
+            self.calendar = CalendarView(self.calendar_frame, self.db, self.filter_category_var, self.show_db_error)
+            self.calendar.frame.pack(fill=tk.BOTH, expand=True)
+        if self.calendar is not None:
+            self.calendar.set_visible(visible)
+            
+    def invalidate_calendar(self, day=None):
+        if self.calendar is not None:
+            self.calendar.invalidate(day)
         
     def add_schedule(self):
         title = self.title_entry.get().strip()
         date = self.date_entry.get().strip()
         time = self.time_entry.get().strip()
+        end_time = self.end_entry.get().strip()
         priority = self.priority_var.get()
         category = self.category_var.get()
         reminder = 1 if self.reminder_var.get() else 0
+        rrule = recurrence.PRESETS.get(self.repeat_var.get())
         desc = self.desc_text.get('1.0', tk.END).strip()
         
         if not all([title, date, time]):
@@ -191,17 +699,71 @@ class ScheduleManager:
         except ValueError:
             messagebox.showerror("错误", "日期或时间格式不正确！\n日期格式：YYYY-MM-DD\n时间格式：HH:MM")
             return
+        try:
+            duration = duration_between(time, end_time) if end_time else None
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
             
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO schedules (title, date, time, description, priority, category, reminder)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (title, date, time, desc, priority, category, reminder))
-        self.conn.commit()
+        due_at = normalize_due(date, time)
+        date, time = due_at.split(' ')
+        if rrule:
+            # 重复日程在列表中只显示一行（首次日期），提醒时间为第一次发生的时间
+            due_at = first_due(rrule, date, time)
         
-        self.clear_inputs()
-        self.refresh_list()
-        messagebox.showinfo("成功", "日程添加成功！")
+        def added(schedule_id):
+            if reminder:
+                self.reminders.add(schedule_id, due_at)
+            self.search_engine.invalidate()
+            self.invalidate_calendar(None if rrule else date)
+            self.insert_row((schedule_id, title, date, time, category, priority, '未完成'), search_text(title, desc))
+            self.clear_inputs()
+            messagebox.showinfo("成功", "日程添加成功！")
+            
+        def checked(conflicts):
+            # 与未完成的日程时间重叠时先确认
+            if conflicts:
+                lines = [f"{title}（{start} ~ {end[11:]}）" for schedule_id, title, start, end in conflicts[:10]]
+                if len(conflicts) > 10:
+                    lines.append(f"……另有 {len(conflicts) - 10} 条")
+                if not messagebox.askyesno("时间冲突", "与以下日程时间重叠，仍要添加吗？\n\n" + "\n".join(lines)):
+                    return
+            self.db.write(ScheduleStore.add, title, date, time, desc, priority, category, reminder, rrule, duration,
+                          callback=added, errback=self.show_db_error)
+            
+        self.db.read(ScheduleStore.conflicts, date, time, duration, rrule, callback=checked, errback=self.show_db_error)
+        
+    def find_free_slot(self):
+        # 从表单中的日期起查找第一个足够长的空闲时间，填入开始、结束时间
+        date = normalize_due(self.date_entry.get().strip(), '00:00')
+        if date is None:
+            messagebox.showerror("错误", "日期格式不正确！\n日期格式：YYYY-MM-DD")
+            return
+        try:
+            end_time = self.end_entry.get().strip()
+            duration = duration_between(self.time_entry.get().strip(), end_time) if end_time else DEFAULT_DURATION
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        start = max(date[:10], datetime.now().strftime('%Y-%m-%d'))
+        end = (datetime.strptime(start, '%Y-%m-%d') + timedelta(days=FREE_SLOT_DAYS)).strftime('%Y-%m-%d')
+        
+        def found(slots):
+            if not slots:
+                messagebox.showinfo("查找空闲时间", f"{FREE_SLOT_DAYS} 天内没有 {duration} 分钟的空闲时间")
+                return
+            slot_start = slots[0][0]
+            slot_end = datetime.strptime(slot_start, '%Y-%m-%d %H:%M') + timedelta(minutes=duration)
+            for entry, value in ((self.date_entry, slot_start[:10]), (self.time_entry, slot_start[11:]),
+                                 (self.end_entry, slot_end.strftime('%H:%M'))):
+                entry.delete(0, tk.END)
+                entry.insert(0, value)
+                
+        # 不早于当前时间（取下一个整刻钟）
+        now = datetime.now() + timedelta(minutes=14)
+        after = now.replace(minute=now.minute // 15 * 15).strftime('%Y-%m-%d %H:%M')
+        self.db.read(ScheduleStore.free_slots, start, end, duration, after,
+                     callback=found, errback=self.show_db_error)
         
     def clear_inputs(self):
         self.title_entry.delete(0, tk.END)
@@ -209,116 +771,456 @@ class ScheduleManager:
         self.date_entry.insert(0, datetime.now().strftime('%Y-%m-%d'))
         self.time_entry.delete(0, tk.END)
         self.time_entry.insert(0, datetime.now().strftime('%H:%M'))
+        self.end_entry.delete(0, tk.END)
         self.priority_var.set("普通")
         self.category_var.set("默认")
         self.reminder_var.set(False)
+        self.repeat_var.set("不重复")
         self.desc_text.delete('1.0', tk.END)
         
+    def on_search_changed(self):
+        # 防抖：停止输入一段时间后才开始搜索，同时立即取消已过期的搜索
+        self.search_engine.cancel()
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY, self.apply_filter)
+        
+    def apply_filter(self):
+        self.search_job = None
+        self.selected_ids.clear()
+        self.tree.selection_set(())
+        self.load_list(reset_offset=True)
+        if self.calendar is not None:
+            self.calendar.refresh()
+        
+    def sort_by(self, column):
+        # 再次点击同一列时切换升序、降序；排序在数据库中完成，列表回到顶部
+        descending = column == self.order.column and not self.order.descending
+        self.order = ListOrder(column, descending)
+        self.show_sort()
+        self.load_list(reset_offset=True)
+        
+    def show_sort(self):
+        for column, text in self.headings.items():
+            if column == self.order.column:
+                text += ' ▼' if self.order.descending else ' ▲'
+            self.tree.heading(column, text=text)
+        
     def refresh_list(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        cursor = self.conn.cursor()
-        search_term = self.search_var.get()
-        category_filter = self.filter_category_var.get()
+        # 数据可能已变化，后台搜索和日历都不能再复用旧的结果
+        self.search_engine.invalidate()
+        self.invalidate_calendar()
+        self.load_list()
         
-        query = '''
-            SELECT title, date, time, category, priority, status 
-            FROM schedules 
-            WHERE 1=1
-        '''
-        params = []
+    def load_list(self, reset_offset=False):
+        search_term = self.search_var.get()
+        category = self.filter_category_var.get()
         
         if search_term:
-            query += ' AND (title LIKE ? OR description LIKE ?)'
-            params.extend([f'%{search_term}%', f'%{search_term}%'])
+            # 搜索结果返回之前继续显示当前列表，到时再回到顶部
+            self.pending_reset = self.pending_reset or reset_offset
+            self.list_generation += 1
+            self.pending_search = self.search_engine.search(search_term, category, self.order,
+                                                            self.include_archive_var.get())
+            self.poll_search()
+            return
             
-        if category_filter != "全部":
-            query += ' AND category = ?'
-            params.append(category_filter)
+        self.search_engine.cancel()
+        self.pending_search = None
+        self.pending_reset = False
+        # 清空搜索框后不再显示上一次搜索的错误
+        self.status_var.set("")
+        self.list_generation += 1
+        generation = self.list_generation
+        order = self.order
+        where, params = ScheduleListModel.make_filter(category)
+        
+        def loaded(total):
+            if generation != self.list_generation:
+                return
+            self.model.reset(category, total, order=order)
+            self.scroll_to(0 if reset_offset else self.view_offset)
+            
+        def loaded_head(result):
+            # 总数和可见区域的第一页一起返回，直接显示
+            if generation != self.list_generation:
+                return
+            total, rows = result
+            self.model.reset(category, total, order=order)
+            self.model.merge(('offset', 0, limit), rows, 0)
+            self.scroll_to(0)
+            self.first_data()
             
-        query += ' ORDER BY date, time'
+        # 连续刷新时只统计最新的一次
+        if reset_offset or self.view_offset == 0:
+            limit = self.visible_rows + OVERSCAN
+            self.db.read(ScheduleStore.head, where, params, limit, order, callback=loaded_head, key='count')
+        else:
+            self.db.read(ScheduleStore.count, where, params, callback=loaded, key='count')
         
-        cursor.execute(query, params)
-        for row in cursor.fetchall():
-            self.tree.insert('', tk.END, values=row)
+    def poll_search(self):
+        if self.pending_search is None:
+            return
+        result = self.search_engine.poll()
+        if result is None or result[0] != self.pending_search:
+            self.root.after(SEARCH_POLL, self.poll_search)
+            return
             
-    def mark_complete(self):
-        selected = self.tree.selection()
-        if not selected:
+        self.pending_search = None
+        if isinstance(result[1], Exception):
+            # 保留当前列表，在状态栏说明搜索没有完成
+            self.pending_reset = False
+            self.status_var.set(f"搜索失败：{result[1]}")
+            return
+        self.status_var.set("")
+        generation, search_term, category, order, keys = result
+        self.model.reset(category, len(keys), search_term, keys, order)
+        self.scroll_to(0 if self.pending_reset else self.view_offset)
+        self.pending_reset = False
+        
+    def render_window(self):
+        start = self.view_offset
+        end = start + self.visible_rows + OVERSCAN
+        rows = self.model.window(start, end)
+        if len(rows) < min(end, self.model.total) - start:
+            # 缓存中还缺少行：保留当前显示，读取完成后再重建
+            self.update_scrollbar()
+            self.request_window()
+            return
+            
+        # 行以 schedules.id 作为 iid，重建可见区域后恢复选中状态
+        self.sync_selection()
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', tk.END, iid=row[0], values=row[1:])
+        self.tree.selection_set([iid for iid in self.tree.get_children() if int(iid) in self.selected_ids])
+        self.tree.yview_moveto(0)
+        self.update_scrollbar()
+        
+    def fill_window(self):
+        # 删除行之后从缓存补齐可见区域末尾，不重建已有的行
+        children = self.tree.get_children()
+        start = self.view_offset + len(children)
+        end = self.view_offset + self.visible_rows + OVERSCAN
+        rows = self.model.window(start, end)
+        for row in rows:
+            self.tree.insert('', tk.END, iid=row[0], values=row[1:])
+        self.update_scrollbar()
+        if len(rows) < min(end, self.model.total) - start:
+            self.request_window()
+            
+    def request_window(self):
+        # 在读线程中读取可见区域缺少的一页；滚动期间只保留最新的请求
+        model = self.model
+        start = self.view_offset
+        request = model.missing(start, start + self.visible_rows + OVERSCAN)
+        if request is None:
+            return
+        version = model.version
+        where, params = model.filter
+        
+        def loaded(rows):
+            if version == model.version:
+                model.merge(request, rows, self.view_offset)
+            # 列表已变化时按新的状态重新请求
+            self.scroll_to(self.view_offset)
+            
+        self.db.read(ScheduleStore.page, request, where, params, model.search_keys, model.order,
+                     callback=loaded, key='window')
+        
+    def update_scrollbar(self):
+        total = self.model.total
+        if total:
+            first = self.view_offset / total
+            last = min(1.0, (self.view_offset + self.visible_rows) / total)
+            self.scrollbar.set(first, last)
+        else:
+            self.scrollbar.set(0, 1)
+            
+    def scroll_to(self, offset):
+        max_offset = max(0, self.model.total - self.visible_rows)
+        self.view_offset = max(0, min(int(offset), max_offset))
+        self.render_window()
+        
+    def scroll_by(self, rows):
+        self.scroll_to(self.view_offset + rows)
+        return 'break'
+        
+    def on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self.scroll_to(float(value) * self.model.total)
+        elif action == 'scroll':
+            step = self.visible_rows if unit == 'pages' else 1
+            self.scroll_by(int(value) * step)
+            
+    def on_mousewheel(self, event):
+        if event.num == 4:
+            return self.scroll_by(-3)
+        if event.num == 5:
+            return self.scroll_by(3)
+        return self.scroll_by(-3 * int(event.delta / 120) or (-1 if event.delta > 0 else 1))
+        
+    def on_tree_configure(self, event):
+        visible_rows = max(1, (event.height - HEADER_HEIGHT) // ROW_HEIGHT)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.scroll_to(self.view_offset)
+            
+    def on_tree_click(self, event):
+        # 不带 Ctrl/Shift 的单击会重新选择，同时清除已滚出可见区域的选中行
+        if self.tree.identify_region(event.x, event.y) in ('cell', 'tree') and not event.state & 0x0005:
+            self.selected_ids.clear()
+            
+    def sync_selection(self):
+        # 可见行以界面上的选中状态为准，不可见的行保留原状态
+        visible = {int(iid) for iid in self.tree.get_children()}
+        selected = {int(iid) for iid in self.tree.selection()}
+        self.selected_ids = (self.selected_ids - visible) | selected
+        
+    def get_selected_ids(self):
+        self.sync_selection()
+        if not self.selected_ids:
             messagebox.showwarning("警告", "请先选择一个日程！")
+        return sorted(self.selected_ids)
+        
+    def insert_row(self, row, haystack):
+        position = self.model.insert(row, haystack)
+        if position is None:
+            return
+        window_size = self.visible_rows + OVERSCAN
+        if position < self.view_offset:
+            # 新行在可见区域之前，平移偏移量使当前可见的行保持不动
+            self.view_offset += 1
+        elif position < self.view_offset + window_size:
+            self.tree.insert('', position - self.view_offset, iid=row[0], values=row[1:])
+            children = self.tree.get_children()
+            if len(children) > window_size:
+                self.tree.delete(children[-1])
+        self.update_scrollbar()
+        
+    def update_rows(self, ids, column, value):
+        if self.model.order.depends_on(column):
+            # 修改的列决定行的位置，按当前排序重新加载
+            self.search_engine.invalidate()
+            self.load_list()
+            return
+        # 只更新缓存和可见行中受影响的值，不重新查询整个列表
+        for row in self.model.update(ids, column, value):
+            if self.tree.exists(row[0]):
+                self.tree.item(row[0], values=row[1:])
+                
+    def remove_rows(self, ids):
+        ids = set(ids)
+        self.selected_ids -= ids
+        self.tree.delete(*[i for i in ids if self.tree.exists(i)])
+        positions = self.model.remove(ids)
+        if positions is None:
+            # 有行已不在缓存中，无法确定其位置，整体重新加载
+            self.load_list()
             return
             
-        item = self.tree.item(selected[0])
-        title = item['values'][0]
-        date = item['values'][1]
-        
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE schedules 
-            SET status = '已完成'
-            WHERE title = ? AND date = ?
-        ''', (title, date))
-        self.conn.commit()
-        self.refresh_list()
+        self.view_offset -= sum(1 for position in positions if position < self.view_offset)
+        if self.view_offset > max(0, self.model.total - self.visible_rows):
+            self.scroll_to(self.view_offset)
+        else:
+            self.fill_window()
+            
+    def mark_complete(self):
+        ids = self.get_selected_ids()
+        if not ids:
+            return
+            
+        def completed(_):
+            self.invalidate_calendar()
+            self.update_rows(ids, 'status', '已完成')
+            
+        self.db.write(ScheduleStore.complete, ids, callback=completed, errback=self.show_db_error)
         
     def delete_schedule(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showwarning("警告", "请先选择一个日程！")
+        ids = self.get_selected_ids()
+        if not ids:
             return
             
-        if messagebox.askyesno("确认", "确定要删除选中的日程吗？"):
-            item = self.tree.item(selected[0])
-            title = item['values'][0]
-            date = item['values'][1]
+        if messagebox.askyesno("确认", f"确定要删除选中的 {len(ids)} 条日程吗？"):
+            def deleted(_):
+                self.search_engine.invalidate()
+                self.invalidate_calendar()
+                self.remove_rows(ids)
+                
+            self.db.write(ScheduleStore.delete, ids, callback=deleted, errback=self.show_db_error)
             
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM schedules WHERE title = ? AND date = ?', (title, date))
-            self.conn.commit()
-            self.refresh_list()
+    def change_category(self, category):
+        ids = self.get_selected_ids()
+        if not ids:
+            return
             
-    def export_schedules(self):
-        try:
-            filename = f"日程导出_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            export_path = os.path.join(os.path.expanduser('~'), 'Documents', 'ScheduleManager', filename)
-            
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT title, date, time, description, category, priority, status
-                FROM schedules ORDER BY date, time
-            ''')
-            
-            with open(export_path, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['标题', '日期', '时间', '描述', '分类', '优先级', '状态'])
-                writer.writerows(cursor.fetchall())
+        def changed(_):
+            self.search_engine.invalidate()
+            self.invalidate_calendar()
+            category_filter = self.filter_category_var.get()
+            if category_filter != "全部" and category_filter != category:
+                # 已不符合当前分类筛选
+                self.remove_rows(ids)
+            else:
+                self.update_rows(ids, 'category', category)
                 
-            messagebox.showinfo("成功", f"数据已导出到：\n{export_path}")
-        except Exception as e:
-            messagebox.showerror("错误", f"导出失败：{str(e)}")
-            
-    def check_reminders(self):
-        current_time = datetime.now()
-        
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT title, date, time 
-            FROM schedules 
-            WHERE reminder = 1 
-            AND status = '未完成'
-            AND datetime(date || ' ' || time) <= datetime(?)
-        ''', (current_time.strftime('%Y-%m-%d %H:%M'),))
-        
-        for row in cursor.fetchall():
-            messagebox.showwarning(
-                "日程提醒", 
-                f"日程：{row[0]}\n时间：{row[1]} {row[2]}"
-            )
+        self.db.write(ScheduleStore.set_category, ids, category, callback=changed, errback=self.show_db_error)
+            
+    def export_schedules(self, fmt='csv'):
+        if self.export_running:
+            messagebox.showwarning("警告", "正在导出，请稍候！")
+            return
+            
+        extension = schedule_io.EXPORT_FORMATS[fmt][1]
+        filename = f"日程导出_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
+        export_path = os.path.join(os.path.dirname(self.db_path), filename)
+        
+        # 与当前列表的搜索和分类筛选保持一致
+        search_term = self.search_var.get()
+        category = self.filter_category_var.get()
+        
+        def progress(exported, total):
+            self.export_progress['maximum'] = max(total, 1)
+            self.export_progress['value'] = exported
+            
+        def finish():
+            self.export_running = False
+            self.export_progress.pack_forget()
+            
+        def done(exported):
+            finish()
+            messagebox.showinfo("成功", f"已导出 {exported} 条日程到：\n{export_path}")
             
+        def failed(error):
+            finish()
+            messagebox.showerror("错误", f"导出失败：{str(error)}")
+            
+        self.export_running = True
+        self.export_progress['value'] = 0
+        self.export_progress.pack(side=tk.RIGHT, padx=5)
+        self.db.read(ScheduleStore.export, export_path, fmt, search_term, category, self.db.reporter(progress),
+                     self.include_archive_var.get(), callback=done, errback=failed)
+        
+    def import_schedules(self):
+        path = filedialog.askopenfilename(
+            title="选择要导入的文件",
+            filetypes=[("CSV 文件", "*.csv"), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+            
+        def done(result):
+            self.refresh_list()
+            message = (f"已导入 {result.imported} 条，跳过 {result.skipped} 条\n"
+                       f"用时 {result.seconds:.1f} 秒（{result.rate:.0f} 行/秒）")
+            if result.errors:
+                details = '\n'.join(f"第 {line} 行：{error}" for line, error in result.errors)
+                message += f"\n\n{details}"
+            messagebox.showinfo("导入完成", message)
+            
+        def failed(error):
+            self.refresh_list()
+            messagebox.showerror("错误", f"导入失败：{str(error)}")
+            
+        # 导入在写线程中执行，期间的其他写操作排队等待
+        self.db.write(ScheduleStore.import_csv, path, callback=done, errback=failed)
+        
+    def archive_step(self, moved=0):
+        # 在写线程中分批归档，每批之间让出写线程；全部完成后维护数据库并等待下一次检查
+        completed_before, horizon = archive.cutoffs()
+        
+        def archived(count):
+            if count == archive.ARCHIVE_BATCH:
+                self.root.after(ARCHIVE_PAUSE, lambda: self.archive_step(moved + count))
+                return
+            if moved + count:
+                # 列表、搜索和日历中可能还有刚被移走的行
+                self.refresh_list()
+            self.db.write(ScheduleStore.maintain, errback=self.show_db_error)
+            self.root.after(ARCHIVE_INTERVAL, self.archive_step)
+            
+        # 出错时不再重试，避免反复弹出错误
+        self.db.write(ScheduleStore.archive_batch, completed_before, horizon, callback=archived,
+                      errback=self.show_db_error)
+        
+    def backup_step(self):
+        # 上一次备份的结果在这里取回；出错时提示一次并停止定期备份
+        if self.backups is None:
+            import backup
+            self.backups = backup.BackupWorker(self.db_path)
+        for result in self.backups.poll():
+            if isinstance(result, Exception):
+                messagebox.showerror("错误", f"备份失败：{str(result)}")
+                return
+        self.backups.request()
+        self.root.after(BACKUP_INTERVAL, self.backup_step)
+        
+    def show_reminders(self, rows):
+        # 到期的日程已在写线程中标记为已提醒
+        lines = [f"日程：{row[0]}\n时间：{row[1]} {row[2]}" for row in rows[:10]]
+        if len(rows) > 10:
+            lines.append(f"……另有 {len(rows) - 10} 条日程到期")
+        messagebox.showwarning("日程提醒", "\n\n".join(lines))
+            
+    def show_db_error(self, error):
+        messagebox.showerror("错误", f"数据库操作失败：{str(error)}")
+        
+    def watch_changes(self, version=None):
+        # 在写线程的连接上读取 data_version：本程序自己的写入不改变它，变化即来自其他窗口或程序
+        def checked(current):
+            if version is not None and current != version:
+                self.external_change()
+            self.root.after(CHANGE_POLL, lambda: self.watch_changes(current))
+            
+        self.db.write(ScheduleStore.data_version, callback=checked, errback=self.show_db_error)
+        
+    def external_change(self):
+        # 保持当前滚动位置重新读取总数和可见区域，日历、搜索缓存和提醒队列都需要重新读取
+        self.refresh_list()
+        self.reminders.reload()
+        
+    def poll_instance(self):
+        if self.instance.poll():
+            # 再次启动时显示已有的窗口
+            self.root.deiconify()
+            self.root.lift()
+            self.root.focus_force()
+        self.root.after(INSTANCE_POLL, self.poll_instance)
+        
+    def close(self):
+        # 等待已提交的写操作完成后再退出
+        if self.instance is not None:
+            self.instance.close()
+        if self.backups is not None:
+            self.backups.close()
+        self.db.close()
+        if self.diagnostics is not None:
+            self.diagnostics.close()
+        self.root.destroy()
+        
     def run(self):
+        # after_idle 排在已挂起的绘制之后执行，此时窗口已经显示
+        self.root.after_idle(self.start)
         self.root.mainloop()
         
 if __name__ == '__main__':
-    app = ScheduleManager()
-    app.run()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == '--rebuild-fts':
+        # 为指定数据库（默认为程序目录下的 schedule.db）重建全文索引
+        db_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedule.db')
+        store = ScheduleStore(db_path)
+        if store.rebuild_fts():
+            print(f"全文索引已重建：{db_path}")
+        else:
+            print("当前 SQLite 不支持 FTS5 trigram 分词器")
+        store.close()
+    else:
+        diagnostics = '--diagnostics' in sys.argv[1:] or os.environ.get(DIAGNOSTICS_ENV, '0') not in ('', '0')
+        instance = None
+        if '--new-window' not in sys.argv[1:]:
+            import single_instance
+            try:
+                instance = single_instance.InstanceServer(os.path.dirname(default_db_path()))
+            except OSError:
+                pass
+        app = ScheduleManager(trace_target(sys.argv[1:]), diagnostics, instance)
+        app.run()
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""日程管理命令行工具。
+
+不依赖 tkinter，可以在没有图形界面的环境中脚本化使用，例如：
+
+    python schedule_cli.py add 周会 2024-05-06 09:30 -c 工作 -r -R FREQ=WEEKLY
+    python schedule_cli.py search 周会
+    python schedule_cli.py list -s priority -n 20
+    python schedule_cli.py archive
+    python schedule_cli.py backup
+    python schedule_cli.py agenda 2024-05-01 2024-06-01
+    python schedule_cli.py month 2024-05
+    python schedule_cli.py free 2024-05-06 -m 90
+    python schedule_cli.py export 日程.ics
+"""
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+import schedule_io
+import archive
+from paths import default_db_path
+from schedule_store import ScheduleStore, ListOrder, SORT_KEYS, duration_between
+
+
+def print_rows(rows):
+    # 每行以制表符分隔：id、日期、时间、分类、优先级、状态、标题
+    count = 0
+    for schedule_id, title, day, time, category, priority, status in rows:
+        print(f'{schedule_id}\t{day}\t{time}\t{category}\t{priority}\t{status}\t{title}')
+        count += 1
+    return count
+
+
+def command_add(store, args):
+    duration = duration_between(args.time, args.end) if args.end else args.duration
+    for schedule_id, title, start, end in store.conflicts(args.date, args.time, duration, args.repeat):
+        print(f"时间冲突：{schedule_id}\t{start} ~ {end[11:]}\t{title}", file=sys.stderr)
+    schedule_id = store.add(args.title, args.date, args.time, args.description,
+                            args.priority, args.category, args.reminder, args.repeat, duration)
+    print(schedule_id)
+
+
+def command_free(store, args):
+    # 列出空闲时间段：开始、结束
+    end = args.end or (date.fromisoformat(args.start) + timedelta(days=7)).isoformat()
+    for start, finish in store.free_slots(args.start, end, args.minutes, None, args.day_start, args.day_end,
+                                          args.limit):
+        print(f'{start}\t{finish}')
+
+
+def command_agenda(store, args):
+    # 列出日期范围内的各次日程，重复日程按规则展开
+    start = args.start or date.today().isoformat()
+    end = args.end or (date.fromisoformat(start) + timedelta(days=7)).isoformat()
+    print_rows(store.occurrences(start, end, args.category))
+
+
+def command_month(store, args):
+    # 每天一行：日期、日程数、未完成数、未完成的高优先级数
+    first = date.fromisoformat((args.month or date.today().isoformat()[:7]) + '-01')
+    end = (first + timedelta(days=31)).replace(day=1)
+    summary = store.day_summary(first.isoformat(), end.isoformat(), args.category)
+    for day in sorted(summary):
+        total, pending, high = summary[day]
+        print(f'{day}\t{total}\t{pending}\t{high}')
+
+
+def command_skip(store, args):
+    store.add_exception(args.id, args.date)
+
+
+def command_list(store, args):
+    print_rows(store.query('', args.category, args.limit, ListOrder(args.sort, args.desc)))
+
+
+def command_search(store, args):
+    print_rows(store.query(args.term, args.category, args.limit, ListOrder(args.sort, args.desc), args.archive))
+
+
+def command_complete(store, args):
+    store.complete(args.ids)
+
+
+def command_delete(store, args):
+    store.delete(args.ids)
+
+
+def command_export(store, args):
+    fmt = args.format
+    if fmt is None:
+        extension = os.path.splitext(args.path)[1].lower()
+        fmt = next((name for name, (label, ext) in schedule_io.EXPORT_FORMATS.items() if ext == extension), 'csv')
+    exported = store.export(args.path, fmt, args.search, args.category, include_archive=args.archive)
+    print(f"已导出 {exported} 条日程到：{args.path}", file=sys.stderr)
+
+
+def command_import(store, args):
+    result = store.import_csv(args.path)
+    for line, error in result.errors:
+        print(f"第 {line} 行：{error}", file=sys.stderr)
+    print(f"已导入 {result.imported} 条，跳过 {result.skipped} 条，"
+          f"用时 {result.seconds:.1f} 秒（{result.rate:.0f} 行/秒）", file=sys.stderr)
+
+
+def command_archive(store, args):
+    if args.vacuum:
+        archive.enable_incremental_vacuum(store.conn)
+    completed_before, horizon = archive.cutoffs(completed_days=args.completed_days, horizon_days=args.horizon_days)
+    moved = 0
+    while True:
+        count = store.archive_batch(completed_before, horizon)
+        moved += count
+        if count < archive.ARCHIVE_BATCH:
+            break
+    freed = store.maintain()
+    print(f"已归档 {moved} 条日程到：{store.archive_path}，回收 {freed} 页", file=sys.stderr)
+
+
+def command_backup(store, args):
+    import backup
+    directory = backup.backup_dir(store.db_path)
+    if args.list:
+        for path in reversed(backup.list_backups(directory)):
+            print(f'{path}\t{os.path.getsize(path)}')
+        return
+    store.attach_archive()
+    path = backup.snapshot(store.conn, directory)
+    backup.prune(directory, backup.KEEP_BACKUPS if args.keep is None else args.keep)
+    print(f"已备份到：{path}", file=sys.stderr)
+
+
+def command_restore(store, args):
+    import backup
+    directory = backup.backup_dir(store.db_path)
+    backups = backup.list_backups(directory)
+    path = args.path or (backups[-1] if backups else None)
+    if path is None:
+        print(f"没有可用的备份：{directory}", file=sys.stderr)
+        return 1
+    # 先备份当前数据库，恢复错了还可以再恢复回来
+    store.attach_archive()
+    current = backup.snapshot(store.conn, directory)
+    if os.path.abspath(current) == os.path.abspath(path):
+        raise ValueError(f"恢复前的备份与要恢复的备份同名，已停止：{path}")
+    backup.restore(path, store.db_path)
+    print(f"已从 {path} 恢复，恢复前的数据库备份在：{current}", file=sys.stderr)
+
+
+def command_rebuild_fts(store, args):
+    if not store.rebuild_fts():
+        print("当前 SQLite 不支持 FTS5 trigram 分词器", file=sys.stderr)
+        return 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='schedule_cli', description="个人日程管理命令行工具")
+    parser.add_argument('--db', help="数据库路径（默认与图形界面相同）")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="添加日程")
+    add.add_argument('title')
+    add.add_argument('date', help="YYYY-MM-DD")
+    add.add_argument('time', help="HH:MM")
+    add.add_argument('-d', '--description', default='')
+    add.add_argument('-p', '--priority', choices=schedule_io.PRIORITIES, default='普通')
+    add.add_argument('-c', '--category', default='默认')
+    add.add_argument('-r', '--reminder', action='store_true', help="开启提醒")
+    add.add_argument('-R', '--repeat', help="重复规则，如 FREQ=WEEKLY;BYDAY=MO,WE")
+    length = add.add_mutually_exclusive_group()
+    length.add_argument('-e', '--end', help="结束时间 HH:MM")
+    length.add_argument('--duration', type=int, help="时长（分钟）")
+    add.set_defaults(handler=command_add)
+
+    list_ = commands.add_parser('list', help="按时间顺序列出日程")
+    list_.add_argument('-c', '--category', default='全部')
+    list_.add_argument('-n', '--limit', type=int)
+    list_.add_argument('-s', '--sort', choices=list(SORT_KEYS), default='date', help="排序列")
+    list_.add_argument('--desc', action='store_true', help="降序")
+    list_.set_defaults(handler=command_list)
+
+    search = commands.add_parser('search', help="在标题和描述中搜索")
+    search.add_argument('term')
+    search.add_argument('-c', '--category', default='全部')
+    search.add_argument('-n', '--limit', type=int)
+    search.add_argument('-s', '--sort', choices=list(SORT_KEYS), default='date', help="排序列")
+    search.add_argument('--desc', action='store_true', help="降序")
+    search.add_argument('-a', '--archive', action='store_true', help="同时搜索已归档的日程")
+    search.set_defaults(handler=command_search)
+
+    agenda = commands.add_parser('agenda', help="列出日期范围内的各次日程（展开重复日程）")
+    agenda.add_argument('start', nargs='?', help="YYYY-MM-DD，默认为今天")
+    agenda.add_argument('end', nargs='?', help="不含该日，默认为开始后 7 天")
+    agenda.add_argument('-c', '--category', default='全部')
+    agenda.set_defaults(handler=command_agenda)
+
+    month = commands.add_parser('month', help="按天统计一个月的日程数")
+    month.add_argument('month', nargs='?', help="YYYY-MM，默认为本月")
+    month.add_argument('-c', '--category', default='全部')
+    month.set_defaults(handler=command_month)
+
+    free = commands.add_parser('free', help="查找空闲时间")
+    free.add_argument('start', help="YYYY-MM-DD")
+    free.add_argument('end', nargs='?', help="不含该日，默认为开始后 7 天")
+    free.add_argument('-m', '--minutes', type=int, default=60, help="至少空闲的分钟数")
+    free.add_argument('--day-start', default='09:00')
+    free.add_argument('--day-end', default='18:00')
+    free.add_argument('-n', '--limit', type=int, default=20)
+    free.set_defaults(handler=command_free)
+
+    skip = commands.add_parser('skip', help="跳过重复日程在某一天的发生")
+    skip.add_argument('id', type=int)
+    skip.add_argument('date', help="YYYY-MM-DD")
+    skip.set_defaults(handler=command_skip)
+
+    complete = commands.add_parser('complete', help="标记为已完成")
+    complete.add_argument('ids', type=int, nargs='+')
+    complete.set_defaults(handler=command_complete)
+
+    delete = commands.add_parser('delete', help="删除日程")
+    delete.add_argument('ids', type=int, nargs='+')
+    delete.set_defaults(handler=command_delete)
+
+    export = commands.add_parser('export', help="导出日程")
+    export.add_argument('path')
+    export.add_argument('-f', '--format', choices=list(schedule_io.EXPORT_FORMATS), help="默认按扩展名判断")
+    export.add_argument('-s', '--search', default='')
+    export.add_argument('-c', '--category', default='全部')
+    export.add_argument('-a', '--archive', action='store_true', help="同时导出已归档的日程")
+    export.set_defaults(handler=command_export)
+
+    import_ = commands.add_parser('import', help="从 CSV 文件导入日程")
+    import_.add_argument('path')
+    import_.set_defaults(handler=command_import)
+
+    archive_ = commands.add_parser('archive', help="把已完成和过于久远的日程移到归档库")
+    archive_.add_argument('--completed-days', type=int, default=archive.COMPLETED_DAYS,
+                          help="已完成的日程在多少天后归档")
+    archive_.add_argument('--horizon-days', type=int, default=archive.HORIZON_DAYS,
+                          help="早于多少天的一次性日程都归档")
+    archive_.add_argument('--vacuum', action='store_true', help="整理一次数据库，使之后归档留下的空间能逐步回收")
+    archive_.set_defaults(handler=command_archive)
+
+    backup_ = commands.add_parser('backup', help="在线备份数据库（包括归档库）")
+    backup_.add_argument('--keep', type=int, help="保留最近几份备份")
+    backup_.add_argument('-l', '--list', action='store_true', help="列出已有的备份，最新的在前")
+    backup_.set_defaults(handler=command_backup)
+
+    restore = commands.add_parser('restore', help="从备份恢复数据库")
+    restore.add_argument('path', nargs='?', help="备份文件（默认为最新的一份）")
+    restore.set_defaults(handler=command_restore)
+
+    rebuild = commands.add_parser('rebuild-fts', help="重建全文索引")
+    rebuild.set_defaults(handler=command_rebuild_fts)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = ScheduleStore(args.db or default_db_path())
+    try:
+        return args.handler(store, args) or 0
+    except (ValueError, OSError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""日程数据的批量导入与导出。
+
+与界面无关，调用方需要传入自己的数据库连接（后台线程中使用时应单独打开连接）。
+启动时只用到搜索条件的构造，csv、json 在第一次导入导出时才加载，以缩短程序启动时间。
+"""
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from migrations import normalize_due, suspend_insert_triggers, resume_insert_triggers, EXCEPTIONS_COLUMN
+
+# 时长以分钟计，为空表示没有结束时间；重复规则和跳过日期（以逗号分隔）为空表示一次性日程；
+# 导入时这三列可以没有
+EXPORT_HEADERS = ['标题', '日期', '时间', '描述', '分类', '优先级', '状态', '时长', '重复规则', '跳过日期']
+CSV_ENCODING = 'utf-8-sig'
+
+IMPORT_BATCH = 1000     # 每批校验并写入的行数
+IMPORT_COMMIT = 20000   # 每个事务包含的行数
+MAX_IMPORT_ERRORS = 20  # 最多保留的错误明细条数
+EXPORT_CHUNK = 1000     # 导出时每次从游标读取的行数
+FTS_MIN_TERM = 3        # trigram 分词器只能为不少于 3 个字符的搜索词使用索引
+
+PRIORITIES = ('高', '普通', '低')
+STATUSES = ('未完成', '已完成')
+
+
+EXPORT_FORMATS = {
+    'csv': ('CSV', '.csv'),
+    'jsonl': ('JSON Lines', '.jsonl'),
+    'ics': ('iCalendar', '.ics'),
+}
+
+EXPORT_KEYS = ['id', 'title', 'date', 'time', 'description', 'category', 'priority', 'status', 'duration', 'rrule',
+               'exdates']
+EXPORT_COLUMNS = (f'id, title, date, time, description, category, priority, status, duration, rrule, '
+                  f'{EXCEPTIONS_COLUMN}')
+
+# iCalendar 的 PRIORITY 取值 1（最高）~ 9（最低）
+ICS_PRIORITIES = {'高': 1, '普通': 5, '低': 9}
+
+
+def fts_phrase(term):
+    # 整个搜索词作为一个短语，trigram 分词下即为子串匹配
+    return '"' + term.replace('"', '""') + '"'
+
+
+def like_pattern(term):
+    # 转义 LIKE 通配符，使搜索词按字面匹配
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def build_filter(search_term, category, use_fts=False):
+    # 返回追加在 WHERE 1=1 之后的条件和参数，与列表的搜索、分类筛选一致
+    where = ''
+    params = []
+
+    if search_term:
+        if use_fts and len(search_term) >= FTS_MIN_TERM:
+            where += ' AND id IN (SELECT rowid FROM schedules_fts WHERE schedules_fts MATCH ?)'
+            params.append(fts_phrase(search_term))
+        else:
+            where += " AND (title LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\')"
+            params.extend([like_pattern(search_term), like_pattern(search_term)])
+
+    if category and category != "全部":
+        where += ' AND category = ?'
+        params.append(category)
+
+    return where, params
+
+
+class ImportResult(namedtuple('ImportResult', 'imported skipped errors seconds')):
+    @property
+    def rate(self):
+        return self.imported / self.seconds if self.seconds else 0.0
+
+
+def exception_dates(text):
+    return sorted(text.split(',')) if text else []
+
+
+def read_csv_rows(path):
+    # 逐行读取，返回 (行号, 按表头取值的函数) ，不会一次性载入整个文件
+    import csv
+    with open(path, newline='', encoding=CSV_ENCODING) as f:
+        reader = csv.reader(f)
+        headers = next(reader, None)
+        if headers is None:
+            return
+        index = {name.strip(): i for i, name in enumerate(headers)}
+        missing = [name for name in EXPORT_HEADERS[:3] if name not in index]
+        if missing:
+            raise ValueError(f"缺少必要的列：{'、'.join(missing)}")
+
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            values = [row[index[name]].strip() if name in index and index[name] < len(row) else ''
+                      for name in EXPORT_HEADERS]
+            yield reader.line_num, values
+
+
+def validate_batch(batch, errors):
+    # 返回 (插入的值, 跳过日期) 列表；重复日程的 due_at 为第一次（未被跳过的）发生时间
+    valid = []
+    for line, (title, date, time_, desc, category, priority, status, duration, rrule, exdates) in batch:
+        due_at = normalize_due(date, time_)
+        exdates = exception_dates(exdates.replace(' ', ''))
+        if not title or due_at is None:
+            error = "缺少标题" if not title else "日期或时间格式不正确"
+        elif any(normalize_due(day, '00:00') != f'{day} 00:00' for day in exdates):
+            error = "跳过日期格式不正确"
+        elif duration and not (duration.isdigit() and int(duration) > 0):
+            error = "时长必须是正整数（分钟）"
+        else:
+            error = None
+        date, time_ = due_at.split(' ') if due_at else (date, time_)
+        if error is None and rrule:
+            from recurrence import next_occurrence
+            try:
+                due_at = next_occurrence(rrule, due_at, None, tuple(exdates))
+            except ValueError as e:
+                error = str(e)
+            else:
+                if due_at is None:
+                    error = "重复规则没有任何发生时间"
+        if error is not None:
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append((line, error))
+            continue
+        valid.append(((
+            title, date, time_, desc,
+            category or '默认',
+            priority if priority in PRIORITIES else '普通',
+            status if status in STATUSES else '未完成',
+            due_at,
+            rrule or None,
+            int(duration) if duration else None,
+        ), exdates if rrule else []))
+    return valid
+
+
+IMPORT_INSERT = '''
+    INSERT INTO schedules (title, date, time, description, category, priority, status, due_at, rrule, duration)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def import_csv(conn, path, progress=None):
+    """从与导出格式相同的 CSV 文件批量导入日程。
+
+    每 IMPORT_BATCH 行校验一次并用 executemany 写入，每 IMPORT_COMMIT 行提交一个事务；
+    格式不正确的行会被跳过。progress(已导入行数) 在每次提交后调用。
+    """
+    conn.execute('PRAGMA journal_mode=WAL')
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    imported = 0
+    skipped = 0
+    errors = []
+
+    def write_chunk(batches):
+        # 逐行维护全文索引和每日统计的代价远高于批量写入：事务内暂停插入触发器，
+        # 写完后一次性为新行补齐，提交前恢复触发器，其他连接看不到中间状态
+        nonlocal imported, skipped
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM schedules')
+            last_id = cursor.fetchone()[0]
+            suspended = suspend_insert_triggers(cursor)
+            for batch in batches:
+                rows = validate_batch(batch, errors)
+                skipped += len(batch) - len(rows)
+                cursor.executemany(IMPORT_INSERT, [row for row, exdates in rows if not exdates])
+                # 有跳过日期的重复日程很少，逐行插入以取得 id
+                for row, exdates in rows:
+                    if exdates:
+                        cursor.execute(IMPORT_INSERT, row)
+                        schedule_id = cursor.lastrowid
+                        cursor.executemany('INSERT OR IGNORE INTO schedule_exceptions (schedule_id, date) VALUES (?, ?)',
+                                           [(schedule_id, day) for day in exdates])
+                imported += len(rows)
+            resume_insert_triggers(cursor, suspended, last_id)
+            conn.commit()
+        except Exception:
+            # 已提交的事务保留，当前事务整体回滚
+            conn.rollback()
+            raise
+        if progress:
+            progress(imported)
+
+    batches = []
+    batch = []
+    for item in read_csv_rows(path):
+        batch.append(item)
+        if len(batch) >= IMPORT_BATCH:
+            batches.append(batch)
+            batch = []
+            if len(batches) * IMPORT_BATCH >= IMPORT_COMMIT:
+                write_chunk(batches)
+                batches = []
+    if batch:
+        batches.append(batch)
+    if batches:
+        write_chunk(batches)
+
+    return ImportResult(imported, skipped, errors, time.perf_counter() - started)
+
+
+def iter_rows(cursor, chunk=EXPORT_CHUNK):
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            return
+        yield rows
+
+
+def write_csv(f, chunks):
+    import csv
+    writer = csv.writer(f)
+    writer.writerow(EXPORT_HEADERS)
+    for rows in chunks:
+        writer.writerows((*row[1:-1], ','.join(exception_dates(row[-1]))) for row in rows)
+        yield len(rows)
+
+
+def write_jsonl(f, chunks):
+    from json import dumps
+    for rows in chunks:
+        f.writelines(dumps(dict(zip(EXPORT_KEYS, (*row[:-1], exception_dates(row[-1])))), ensure_ascii=False) + '\n'
+                     for row in rows)
+        yield len(rows)
+
+
+def ics_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_fold(line):
+    # 按 RFC 5545 每行不超过 75 个字节，续行以空格开头
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while data:
+        cut = min(limit, len(data))
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ics_time(due_at):
+    # 'YYYY-MM-DD HH:MM' -> 'YYYYMMDDTHHMM00'（本地时间）
+    return due_at.replace('-', '').replace(':', '').replace(' ', 'T') + '00'
+
+
+def write_ics(f, chunks):
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//RyanZhao//ScheduleManager//CN\r\n')
+    for rows in chunks:
+        for schedule_id, title, date, time_, desc, category, priority, status, duration, rrule, exdates in rows:
+            due_at = normalize_due(date, time_)
+            if due_at is None:
+                continue
+            lines = [
+                'BEGIN:VEVENT',
+                f'UID:schedule-{schedule_id}@schedulemanager',
+                f'DTSTAMP:{stamp}',
+                f'DTSTART:{ics_time(due_at)}',
+            ]
+            if duration:
+                end = datetime.strptime(due_at, '%Y-%m-%d %H:%M') + timedelta(minutes=duration)
+                lines.append(f"DTEND:{ics_time(end.strftime('%Y-%m-%d %H:%M'))}")
+            lines.append(f'SUMMARY:{ics_text(title)}')
+            if rrule:
+                # 重复日程的 date、time 即第一次发生的时间，跳过的各次与 DTSTART 同一时刻
+                lines.append(f'RRULE:{rrule}')
+                if exdates:
+                    start_time = due_at[10:]
+                    lines.append('EXDATE:' + ','.join(ics_time(day + start_time) for day in exception_dates(exdates)))
+            if desc:
+                lines.append(f'DESCRIPTION:{ics_text(desc)}')
+            if category:
+                lines.append(f'CATEGORIES:{ics_text(category)}')
+            lines.append(f'PRIORITY:{ICS_PRIORITIES.get(priority, 5)}')
+            lines.append('END:VEVENT')
+            f.write(''.join(ics_fold(line) for line in lines))
+        yield len(rows)
+    f.write('END:VCALENDAR\r\n')
+
+
+EXPORT_WRITERS = {
+    'csv': (write_csv, CSV_ENCODING),
+    'jsonl': (write_jsonl, 'utf-8'),
+    'ics': (write_ics, 'utf-8'),
+}
+
+
+def export_schedules(conn, path, fmt='csv', where='', params=(), progress=None, archived=None):
+    """按 date, time 顺序流式导出符合筛选条件的日程，返回导出的行数。
+
+    where/params 与 build_filter 的返回值相同；游标按 EXPORT_CHUNK 行分块读取，
+    不会把整张表读入内存。progress(已导出行数, 总行数) 在每块写入后调用。
+    archived 为归档库（已 ATTACH 为 archive）的 (where, params) 时一并导出。
+    """
+    write, encoding = EXPORT_WRITERS[fmt]
+    source = f'SELECT {EXPORT_COLUMNS} FROM main.schedules WHERE 1=1{where}'
+    params = list(params)
+    if archived is not None:
+        source += f' UNION ALL SELECT {EXPORT_COLUMNS} FROM archive.schedules WHERE 1=1{archived[0]}'
+        params += archived[1]
+
+    cursor = conn.cursor()
+    total = None
+    if progress:
+        cursor.execute(f'SELECT COUNT(*) FROM ({source})', params)
+        total = cursor.fetchone()[0]
+
+    cursor.execute(f'{source} ORDER BY date, time, id', params)
+
+    exported = 0
+    with open(path, 'w', newline='', encoding=encoding) as f:
+        for count in write(f, iter_rows(cursor)):
+            exported += count
+            if progress:
+                progress(exported, total)
+    return exported
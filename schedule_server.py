@@ -0,0 +1,457 @@
+"""本机 JSON/HTTP 接口，供仪表板和脚本在不启动图形界面的情况下读写日程。
+
+    python schedule_server.py --port 8765
+
+只监听 127.0.0.1，并且只接受 Host 为 127.0.0.1:端口 或 localhost:端口 的请求（防止 DNS 重绑定），
+拒绝带有其他来源 Origin 的请求，POST 的请求体必须是 application/json，网页无法跨站提交修改。基于 asyncio，每个连接一个协程，支持 HTTP/1.1 keep-alive；数据库访问交给
+db_worker.DatabaseExecutor（若干读连接加一个串行的写连接），同时在途的数据库任务不超过
+MAX_PENDING，其余请求在协程中排队等待。
+
+    GET  /schedules?search=&category=全部&sort=date&desc=0&limit=100&cursor=
+         按键集分页，响应中的 next 即下一页的 cursor，第一页同时返回 total；
+         带 ETag，If-None-Match 与之相同时直接返回 304，不查询数据库
+    POST /schedules               添加一条（对象）或多条（数组，在一个事务中写入）
+    POST /schedules/complete      {"ids": [...]}
+    POST /schedules/delete        {"ids": [...]}
+    GET  /export?format=csv&search=&category=全部&archive=0
+         分块流式返回导出文件
+
+列表和导出的响应都以 Transfer-Encoding: chunked 分块发送，每块之后等待发送缓冲区腾空。
+ETag 由写入代数组成：本服务的写入完成后立即递增；其他程序的写入通过写连接上的
+PRAGMA data_version 每 CHANGE_POLL 秒检查一次，在此之前可能仍返回 304。
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import tempfile
+import traceback
+from urllib.parse import urlsplit, parse_qs
+
+import schedule_io
+from db_worker import DatabaseExecutor
+from paths import default_db_path
+from schedule_store import ScheduleStore, ListOrder, LIST_COLUMNS, key_values
+
+DEFAULT_PORT = 8765
+READERS = 4             # 读连接数
+MAX_PENDING = 64        # 同时在途的数据库任务数
+PAGE_LIMIT = 100        # 列表默认每页行数
+MAX_PAGE_LIMIT = 1000
+STREAM_ROWS = 200       # 列表响应每块包含的行数
+EXPORT_CHUNK = 64 * 1024
+MAX_BODY = 1024 * 1024  # 请求体上限（字节）
+MAX_HEADERS = 100
+MAX_LINE = 8 * 1024     # 请求行和每个请求头的长度上限（字节）
+KEEP_ALIVE = 30         # 空闲连接的超时（秒）
+CHANGE_POLL = 1.0       # 检查其他程序写入的间隔（秒）
+
+ROW_KEYS = LIST_COLUMNS.split(', ')
+# POST /schedules 接受的字段及类型，与 ScheduleStore.add 的参数一致；必填字段不能为 null，
+# 其余字段中只有默认值为 None 的可以为 null
+REQUIRED_FIELDS = ('title', 'date', 'time')
+NULLABLE_FIELDS = ('rrule', 'duration')
+ADD_FIELDS = {
+    'title': str, 'date': str, 'time': str, 'description': str, 'priority': str, 'category': str,
+    'reminder': bool, 'rrule': str, 'duration': int,
+}
+TYPE_NAMES = {str: '字符串', bool: '布尔值', int: '整数'}
+EXPORT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'ics': 'text/calendar; charset=utf-8',
+}
+JSON_TYPE = 'application/json; charset=utf-8'
+REASONS = {
+    200: 'OK', 201: 'Created', 304: 'Not Modified', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+    405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large', 414: 'URI Too Long',
+    415: 'Unsupported Media Type', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error',
+}
+
+
+class Request:
+    __slots__ = ('method', 'path', 'query', 'headers', 'body', 'version')
+
+    def __init__(self, method, path, query, headers, body, version):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.version = version
+
+    @property
+    def keep_alive(self):
+        # HTTP/1.0 的客户端在响应结束后关闭连接
+        return self.version == 'HTTP/1.1' and self.headers.get('connection', '').lower() != 'close'
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(text, order):
+    # cursor 为上一页最后一行的排序键，长度须与当前排序一致
+    try:
+        values = json.loads(base64.urlsafe_b64decode(text.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise HTTPError(400, "cursor 不正确")
+    if not isinstance(values, list) or len(values) != len(order.columns):
+        raise HTTPError(400, "cursor 与排序方式不一致")
+    return order.wrap(tuple(values))
+
+
+def schedule_fields(item, index=None):
+    # 批量添加时 index 为该条在数组中的位置，写入错误信息
+    where = f"第 {index + 1} 条日程：" if index is not None else ""
+    if not isinstance(item, dict):
+        raise HTTPError(400, f"{where}应为 JSON 对象")
+    for name in REQUIRED_FIELDS:
+        if name not in item:
+            raise HTTPError(400, f"{where}缺少字段 {name}")
+    for name, value in item.items():
+        expected = ADD_FIELDS.get(name)
+        if expected is None:
+            raise HTTPError(400, f"{where}未知字段：{name}")
+        if value is None and name in NULLABLE_FIELDS:
+            continue
+        if not isinstance(value, expected) or isinstance(value, bool) != (expected is bool):
+            raise HTTPError(400, f"{where}字段 {name} 应为{TYPE_NAMES[expected]}")
+    return item
+
+
+def schedule_ids(body):
+    ids = body.get('ids') if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise HTTPError(400, '请求体应为 {"ids": [整数, ...]}')
+    return ids
+
+
+# 以下任务函数在 DatabaseExecutor 的工作线程中执行
+
+def list_schedules(store, search, category, order, limit, anchor):
+    # 第一页同时统计总数
+    where, params = store.filter(search, category)
+    if anchor is None:
+        return store.head(where, params, limit, order)
+    return None, store.page(('after', anchor, limit), where, params, order=order)
+
+
+def export_file(store, fmt, search, category, include_archive):
+    # 导出到临时文件，由事件循环分块发送后删除
+    fd, path = tempfile.mkstemp(suffix=schedule_io.EXPORT_FORMATS[fmt][1])
+    os.close(fd)
+    try:
+        store.export(path, fmt, search, category, None, include_archive)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+class ScheduleServer:
+    def __init__(self, db_path, readers=READERS):
+        self.db_path = db_path
+        self.readers = readers
+        self.generation = 0
+        # 服务重启后代数从头计数，ETag 中加入本次启动的标识，避免与之前的 ETag 相同
+        self.instance = secrets.token_hex(4)
+        self.loop = None
+        self.db = None
+        self.slots = None
+        self.hosts = set()  # 允许的 Host，启动后按实际端口确定
+        self.routes = {
+            '/schedules': {'GET': self.get_schedules, 'POST': self.post_schedules},
+            '/schedules/complete': {'POST': self.post_complete},
+            '/schedules/delete': {'POST': self.post_delete},
+            '/export': {'GET': self.get_export},
+        }
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(MAX_PENDING)
+        self.db = DatabaseExecutor(lambda: ScheduleStore(self.db_path), self.after, self.readers)
+        self.watcher = asyncio.create_task(self.watch_changes())
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        port = server.sockets[0].getsockname()[1]
+        self.hosts = {f'127.0.0.1:{port}', f'localhost:{port}'}
+        return server
+
+    def close(self):
+        self.watcher.cancel()
+        self.db.close()
+
+    def after(self, delay, callback):
+        # DatabaseExecutor 通过它定时在事件循环中收取已完成的任务
+        self.loop.call_later(delay / 1000, callback)
+
+    async def call(self, write, fn, *args):
+        # 结果通过 Future 交回协程，错误在 await 处抛出，不需要 errback
+        submit = self.db.write if write else self.db.read
+        async with self.slots:
+            result = await asyncio.wrap_future(submit(fn, *args, errback=lambda error: None))
+        if write:
+            self.generation += 1
+        return result
+
+    async def watch_changes(self):
+        version = None
+        while True:
+            # data_version 只反映其他连接的提交，因此固定在写连接上读取；不经过 call，不递增代数
+            try:
+                current = await asyncio.wrap_future(self.db.write(ScheduleStore.data_version, errback=lambda error: None))
+            except sqlite3.Error:
+                current = version
+            if version is not None and current != version:
+                self.generation += 1
+            version = current
+            await asyncio.sleep(CHANGE_POLL)
+
+    # HTTP
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), KEEP_ALIVE)
+                except HTTPError as e:
+                    # 请求本身不完整，无法继续复用连接
+                    await self.send_json(writer, None, e.status, {'error': str(e)})
+                    break
+                if request is None:
+                    break
+                try:
+                    await self.dispatch(writer, request)
+                except HTTPError as e:
+                    await self.send_json(writer, request, e.status, {'error': str(e)})
+                except ValueError as e:
+                    # ScheduleStore 的参数校验
+                    await self.send_json(writer, request, 400, {'error': str(e)})
+                except ConnectionError:
+                    raise
+                except Exception:
+                    # 详细信息只写入服务的日志，不返回给客户端
+                    traceback.print_exc()
+                    await self.send_json(writer, request, 500, {'error': "服务器内部错误"})
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def readline(self, reader, status):
+        # 超过 StreamReader 的 limit 时 readline 抛出 ValueError，转为对应的错误响应
+        try:
+            return await reader.readline()
+        except ValueError:
+            raise HTTPError(status, "请求行过长" if status == 414 else "请求头过长")
+
+    async def read_request(self, reader):
+        line = await self.readline(reader, 414)
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, "请求行不正确")
+        if version not in ('HTTP/1.0', 'HTTP/1.1'):
+            raise HTTPError(400, f"不支持的协议版本：{version}")
+
+        headers = {}
+        while True:
+            line = await self.readline(reader, 431)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(400, "请求头过多")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(411, "请求体需要 Content-Length")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "Content-Length 不正确")
+        if length > MAX_BODY:
+            raise HTTPError(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b''
+
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return Request(method.upper(), url.path.rstrip('/') or '/', query, headers, body, version)
+
+    async def dispatch(self, writer, request):
+        # 其他网站的页面可以让浏览器向本机发送请求：Host 不是本机地址（DNS 重绑定）
+        # 或 Origin 是其他来源时拒绝
+        if request.headers.get('host', '').lower() not in self.hosts:
+            raise HTTPError(403, "只接受发往本机地址的请求")
+        origin = request.headers.get('origin')
+        if origin is not None and origin.lower().removeprefix('http://') not in self.hosts:
+            raise HTTPError(403, f"不接受来自 {origin} 的请求")
+        route = self.routes.get(request.path)
+        if route is None:
+            raise HTTPError(404, f"没有 {request.path}")
+        handler = route.get(request.method)
+        if handler is None:
+            raise HTTPError(405, f"{request.path} 不支持 {request.method}")
+        await handler(writer, request)
+
+    def head(self, request, status, headers):
+        # request 为 None 表示请求本身无法解析，响应后关闭连接
+        lines = [f'HTTP/1.1 {status} {REASONS[status]}']
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        if request is None or not request.keep_alive:
+            lines.append('Connection: close')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def send(self, writer, request, status, body=b'', content_type=JSON_TYPE, headers=()):
+        headers = [('Content-Length', len(body)), *headers]
+        if status != 304:
+            headers.append(('Content-Type', content_type))
+        writer.write(self.head(request, status, headers) + body)
+        await writer.drain()
+
+    async def send_json(self, writer, request, status, data, headers=()):
+        await self.send(writer, request, status, json.dumps(data, ensure_ascii=False).encode('utf-8'), JSON_TYPE, headers)
+
+    async def send_chunks(self, writer, request, chunks, content_type, headers=(), length=None):
+        # HTTP/1.0 不支持分块编码：给出 Content-Length（未知时先收集全部内容）后关闭连接
+        headers = [('Content-Type', content_type), *headers]
+        if request.version != 'HTTP/1.1':
+            if length is None:
+                body = b''.join([chunk async for chunk in chunks])
+                await self.send(writer, request, 200, body, content_type, headers[1:])
+                return
+            writer.write(self.head(request, 200, [('Content-Length', length), *headers]))
+            async for chunk in chunks:
+                writer.write(chunk)
+                await writer.drain()
+            return
+
+        writer.write(self.head(request, 200, [*headers, ('Transfer-Encoding', 'chunked')]))
+        async for chunk in chunks:
+            if chunk:
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    def json_body(self, request):
+        # 跨站表单只能以 text/plain 等类型提交，要求 application/json 使之无法伪造
+        if request.headers.get('content-type', '').split(';')[0].strip().lower() != 'application/json':
+            raise HTTPError(415, "请求体应为 application/json")
+        try:
+            return json.loads(request.body or b'null')
+        except ValueError:
+            raise HTTPError(400, "请求体不是合法的 JSON")
+
+    # 接口
+
+    async def get_schedules(self, writer, request):
+        # 代数在查询之前读取，查询期间发生的写入会使下一次请求的 ETag 不同
+        etag = f'"{self.instance}-{self.generation}"'
+        if etag in (tag.strip().removeprefix('W/') for tag in request.headers.get('if-none-match', '').split(',')):
+            await self.send(writer, request, 304, headers=[('ETag', etag)])
+            return
+
+        query = request.query
+        order = ListOrder(query.get('sort', 'date'), query.get('desc', '0') not in ('', '0', 'false'))
+        try:
+            limit = min(max(int(query.get('limit', PAGE_LIMIT)), 1), MAX_PAGE_LIMIT)
+        except ValueError:
+            raise HTTPError(400, "limit 应为整数")
+        anchor = decode_cursor(query['cursor'], order) if query.get('cursor') else None
+        total, rows = await self.call(False, list_schedules, query.get('search', ''), query.get('category', '全部'),
+                                      order, limit, anchor)
+        next_cursor = encode_cursor(list(key_values(order.key(rows[-1])))) if len(rows) == limit else None
+
+        async def chunks():
+            yield b'{"items": ['
+            for start in range(0, len(rows), STREAM_ROWS):
+                items = (json.dumps(dict(zip(ROW_KEYS, row)), ensure_ascii=False) for row in rows[start:start + STREAM_ROWS])
+                yield (',' if start else '').encode() + ','.join(items).encode('utf-8')
+            tail = {'next': next_cursor}
+            if total is not None:
+                tail['total'] = total
+            yield b'], ' + json.dumps(tail, ensure_ascii=False)[1:].encode('utf-8')
+
+        await self.send_chunks(writer, request, chunks(), JSON_TYPE, [('ETag', etag), ('Cache-Control', 'no-cache')])
+
+    async def post_schedules(self, writer, request):
+        data = self.json_body(request)
+        if isinstance(data, list):
+            ids = await self.call(True, ScheduleStore.add_many,
+                                  [schedule_fields(item, index) for index, item in enumerate(data)])
+            await self.send_json(writer, request, 201, {'ids': ids})
+        else:
+            ids = await self.call(True, ScheduleStore.add_many, [schedule_fields(data)])
+            await self.send_json(writer, request, 201, {'id': ids[0]})
+
+    async def post_complete(self, writer, request):
+        ids = schedule_ids(self.json_body(request))
+        await self.call(True, ScheduleStore.complete, ids)
+        await self.send_json(writer, request, 200, {'ids': ids})
+
+    async def post_delete(self, writer, request):
+        ids = schedule_ids(self.json_body(request))
+        await self.call(True, ScheduleStore.delete, ids)
+        await self.send_json(writer, request, 200, {'ids': ids})
+
+    async def get_export(self, writer, request):
+        query = request.query
+        fmt = query.get('format', 'csv')
+        if fmt not in EXPORT_TYPES:
+            raise HTTPError(400, f"不支持的导出格式：{fmt}")
+        path = await self.call(False, export_file, fmt, query.get('search', ''), query.get('category', '全部'),
+                               query.get('archive', '0') not in ('', '0', 'false'))
+
+        async def chunks():
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = await self.loop.run_in_executor(None, f.read, EXPORT_CHUNK)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        try:
+            await self.send_chunks(writer, request, chunks(), EXPORT_TYPES[fmt], length=os.path.getsize(path))
+        finally:
+            os.remove(path)
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        server = await self.start(host, port)
+        print(f"正在监听 http://{host}:{port}/ ，数据库：{self.db_path}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="日程管理本机 JSON/HTTP 接口")
+    parser.add_argument('--db', help="数据库路径（默认与图形界面相同）")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--readers', type=int, default=READERS, help="读连接数")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(ScheduleServer(args.db or default_db_path(), args.readers).serve('127.0.0.1', args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,625 @@
+"""日程数据的存取层，与界面无关。
+
+ScheduleStore 持有一个数据库连接，负责结构迁移和所有查询、写入；
+两个图形界面和命令行工具都建立在它之上。一个实例只能在创建它的线程中使用，
+后台线程需要各自创建实例（见 db_worker.DatabaseExecutor）。
+
+多个窗口、命令行工具或其他程序可以同时打开同一个数据库：WAL 模式下读写互不阻塞，
+写入之间等待 BUSY_TIMEOUT，仍然拿不到写锁时由 retry_busy 退避后重试整个操作。
+"""
+import functools
+import os
+import random
+import sqlite3
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date as Date, datetime, timedelta
+
+from migrations import (migrate, has_fts, has_intervals, rebuild_fts_index, normalize_due, START_MINUTE, END_MINUTE,
+                        EXCEPTIONS_COLUMN)
+import schedule_io
+import recurrence
+import archive
+
+LIST_COLUMNS = 'id, title, date, time, category, priority, status'
+
+BUSY_TIMEOUT = 5.0   # 等待其他连接释放写锁的时间（秒）
+BUSY_RETRIES = 4     # 超时后重试整个操作的次数
+BUSY_BACKOFF = 0.2   # 第一次重试前的等待时间（秒），之后每次加倍并加入随机抖动
+
+# 与迁移 add_sort_keys 中生成列 priority_rank、status_rank 的取值一致
+PRIORITY_RANKS = {'高': 0, '普通': 1, '低': 2}
+STATUS_RANKS = {'未完成': 0, '已完成': 1}
+
+# 列表可排序的列：(SQL 排序键, 从列表行取同样排序键的函数)。排序键都以 id 结尾，
+# 顺序唯一，可以用作键集分页的锚点；每一种都有对应的索引（见 migrations）
+SORT_KEYS = {
+    'date': (('date', 'time', 'id'), lambda row: (row[2], row[3], row[0])),
+    'time': (('time', 'date', 'id'), lambda row: (row[3], row[2], row[0])),
+    'title': (('title', 'date', 'time', 'id'), lambda row: (row[1], row[2], row[3], row[0])),
+    'category': (('category', 'date', 'time', 'id'), lambda row: (row[4], row[2], row[3], row[0])),
+    'priority': (('priority_rank', 'date', 'time', 'id'),
+                 lambda row: (PRIORITY_RANKS.get(row[5], 3), row[2], row[3], row[0])),
+    'status': (('status_rank', 'date', 'time', 'id'),
+               lambda row: (STATUS_RANKS.get(row[6], 2), row[2], row[3], row[0])),
+}
+
+
+class Descending:
+    # 反转比较结果的排序键包装，降序列表的键仍可直接用于 bisect 和 sorted
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    def __lt__(self, other):
+        return other.values < self.values
+
+    def __eq__(self, other):
+        return isinstance(other, Descending) and self.values == other.values
+
+    def __repr__(self):
+        return f'Descending({self.values!r})'
+
+
+def key_values(key):
+    return key.values if isinstance(key, Descending) else key
+
+
+class ListOrder:
+    """列表的排序方式：按 SORT_KEYS 中的一列升序或降序。
+
+    key(row) 返回行在该顺序下的排序键（降序时包装为 Descending），
+    键集分页的锚点和搜索结果的排序键都使用它。
+    """
+
+    def __init__(self, column='date', descending=False):
+        if column not in SORT_KEYS:
+            raise ValueError(f"不能按 {column} 排序")
+        self.column = column
+        self.descending = descending
+        self.columns, self.row_key = SORT_KEYS[column]
+
+    def __eq__(self, other):
+        return isinstance(other, ListOrder) and (self.column, self.descending) == (other.column, other.descending)
+
+    def __hash__(self):
+        return hash((self.column, self.descending))
+
+    def __repr__(self):
+        return f'ListOrder({self.column!r}, descending={self.descending})'
+
+    def wrap(self, values):
+        return Descending(values) if self.descending else values
+
+    def key(self, row):
+        return self.wrap(self.row_key(row))
+
+    def depends_on(self, column):
+        # 修改该列是否会改变行在列表中的位置
+        return column in ('date', 'time', self.column)
+
+    def order_by(self, reverse=False):
+        direction = ' DESC' if self.descending != reverse else ''
+        return ', '.join(column + direction for column in self.columns)
+
+    def after(self, reverse=False):
+        # 在显示顺序中排在锚点之后（reverse 时为之前）的条件，参数为 key_values(锚点)
+        operator = '<' if self.descending != reverse else '>'
+        return f"({', '.join(self.columns)}) {operator} ({', '.join('?' * len(self.columns))})"
+
+
+DEFAULT_ORDER = ListOrder()
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_minute(text):
+    # 'YYYY-MM-DD HH:MM' 与区间索引中的分钟数互相转换
+    return int((recurrence.to_datetime(text) - EPOCH).total_seconds()) // 60
+
+
+def from_minute(minute):
+    return (EPOCH + timedelta(minutes=minute)).strftime('%Y-%m-%d %H:%M')
+
+
+def duration_between(start_time, end_time):
+    # 由开始、结束时间（HH:MM）计算时长（分钟），结束时间不晚于开始时间时视为次日
+    if normalize_due('2000-01-01', end_time) is None:
+        raise ValueError("结束时间格式不正确")
+    start = to_minute(normalize_due('2000-01-01', start_time))
+    end = to_minute(normalize_due('2000-01-01', end_time))
+    return end - start if end > start else end - start + 24 * 60
+
+
+def split_dates(text):
+    return tuple(sorted(text.split(','))) if text else ()
+
+
+def retry_busy(method):
+    # 写入方法的装饰器：数据库被其他进程锁住时回滚，退避后重新执行。
+    # 被装饰的方法要么整体提交，要么重复执行也不会重复写入
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        delay = BUSY_BACKOFF
+        for attempt in range(BUSY_RETRIES):
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                self.rollback()
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def first_due(rrule, date, time):
+    due_at = recurrence.next_occurrence(rrule, f'{date} {time}', None)
+    if due_at is None:
+        raise ValueError("重复规则没有任何发生时间")
+    return due_at
+
+
+class ScheduleStore:
+    def __init__(self, db_path, factory=sqlite3.Connection):
+        # factory 为连接的类，开启诊断时为 diagnostics.TimedConnection
+        self.db_path = db_path
+        opened = time.perf_counter()
+        # timeout 即 busy_timeout：写锁被占用时等待而不是立即报“database is locked”
+        self.conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, factory=factory)
+        # 只对新建的数据库生效，使归档后能逐步回收空闲页（见 archive.maintain）
+        self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        # WAL 模式下读连接不会被写事务阻塞；该设置会保存在数据库文件中
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        migrating = time.perf_counter()
+        migrate(self.conn)
+        self.fts_enabled = has_fts(self.conn.cursor())
+        self.intervals_enabled = has_intervals(self.conn.cursor())
+        self.archive_path = archive.archive_path(db_path)
+        self.archive_attached = False
+        # (阶段, 开始, 结束)，时间为 perf_counter，供启动时间线使用
+        self.timings = [('db_open', opened, migrating), ('migration', migrating, time.perf_counter())]
+
+    def close(self):
+        self.conn.close()
+
+    def rollback(self):
+        if self.conn.in_transaction:
+            self.conn.rollback()
+
+    def filter(self, search_term='', category='全部'):
+        return schedule_io.build_filter(search_term, category, self.fts_enabled)
+
+    def attach_archive(self, create=False):
+        # 按需 ATTACH 归档库；归档库还不存在且 create 为 False 时返回 False
+        if not self.archive_attached:
+            if not create and not os.path.exists(self.archive_path):
+                return False
+            archive.attach(self.conn, self.archive_path)
+            self.archive_attached = True
+        return True
+
+    def tables(self):
+        # 修改、删除同时作用于归档库中的行（搜索结果可以包含已归档的日程）
+        if self.attach_archive():
+            return ('main.schedules', f'{archive.ARCHIVE_SCHEMA}.schedules')
+        return ('main.schedules',)
+
+    # 写入
+
+    @retry_busy
+    def add(self, title, date, time, description='', priority='普通', category='默认', reminder=False, rrule=None,
+            duration=None):
+        schedule_id = self.insert(title, date, time, description, priority, category, reminder, rrule, duration)
+        self.conn.commit()
+        return schedule_id
+
+    @retry_busy
+    def add_many(self, items):
+        # items 为 add 的关键字参数字典列表，在一个事务中全部写入，有一条不合法时都不写入
+        try:
+            ids = [self.insert(**item) for item in items]
+        except Exception:
+            self.rollback()
+            raise
+        self.conn.commit()
+        return ids
+
+    def insert(self, title, date, time, description='', priority='普通', category='默认', reminder=False, rrule=None,
+               duration=None):
+        # 校验并插入一行，不提交
+        due_at = normalize_due(date, time)
+        if not title or due_at is None:
+            raise ValueError("缺少标题" if not title else "日期或时间格式不正确")
+        if duration is not None and duration <= 0:
+            raise ValueError("时长应为正整数（分钟）")
+        date, time = due_at.split(' ')
+        if rrule:
+            # 重复日程的 due_at 保存下一次（尚未提醒的）发生时间
+            due_at = first_due(rrule, date, time)
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT INTO schedules (title, date, time, description, priority, category, reminder, due_at, rrule, duration)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (title, date, time, description, priority, category, 1 if reminder else 0, due_at, rrule or None,
+              duration))
+        return cursor.lastrowid
+
+    @retry_busy
+    def add_exception(self, schedule_id, date):
+        # 跳过重复日程在某一天的发生；若正好是下一次提醒，则顺延到之后的一次
+        if normalize_due(date, '00:00') is None:
+            raise ValueError("日期格式不正确")
+        date = normalize_due(date, '00:00')[:10]
+        self.conn.execute('INSERT OR IGNORE INTO schedule_exceptions (schedule_id, date) VALUES (?, ?)',
+                          (schedule_id, date))
+        row = self.conn.execute(f'''
+            SELECT rrule, date, time, due_at, {EXCEPTIONS_COLUMN}
+            FROM schedules WHERE id = ? AND rrule IS NOT NULL
+        ''', (schedule_id,)).fetchone()
+        if row is None:
+            self.conn.rollback()
+            raise ValueError(f"没有 id 为 {schedule_id} 的重复日程")
+        rrule, start_date, start_time, due_at, exdates = row
+        if due_at and due_at[:10] == date:
+            next_due = recurrence.next_occurrence(rrule, f'{start_date} {start_time}', due_at, split_dates(exdates))
+            self.conn.execute('UPDATE schedules SET due_at = COALESCE(?, due_at), notified = ? WHERE id = ?',
+                              (next_due, 0 if next_due else 1, schedule_id))
+        self.conn.commit()
+
+    @retry_busy
+    def update(self, ids, column, value):
+        # column 只会是代码中写定的列名
+        for table in self.tables():
+            self.conn.executemany(f'UPDATE {table} SET {column} = ? WHERE id = ?', [(value, i) for i in ids])
+        self.conn.commit()
+
+    def complete(self, ids):
+        self.update(ids, 'status', '已完成')
+
+    def set_category(self, ids, category):
+        self.update(ids, 'category', category)
+
+    @retry_busy
+    def delete(self, ids):
+        for table in self.tables():
+            self.conn.executemany(f'DELETE FROM {table} WHERE id = ?', [(i,) for i in ids])
+        self.conn.commit()
+
+    # 查询
+
+    def data_version(self):
+        # 其他连接（包括其他进程）提交后变化，本连接自己的提交不会改变它
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def count(self, where='', params=()):
+        cursor = self.conn.cursor()
+        cursor.execute(f'SELECT COUNT(*) FROM schedules WHERE 1=1{where}', params)
+        return cursor.fetchone()[0]
+
+    def query(self, search_term='', category='全部', limit=None, order=DEFAULT_ORDER, include_archive=False):
+        # 按 order（默认为 date, time, id）返回符合条件的列表行，结果以游标逐行读取
+        where, params = self.filter(search_term, category)
+        query = f'SELECT {LIST_COLUMNS} FROM schedules WHERE 1=1{where} ORDER BY {order.order_by()}'
+        if include_archive and self.attach_archive():
+            archive_where, archive_params = schedule_io.build_filter(search_term, category)
+            columns = f'{LIST_COLUMNS}, priority_rank, status_rank'
+            query = f'''
+                SELECT {LIST_COLUMNS} FROM (
+                    SELECT {columns} FROM main.schedules WHERE 1=1{where}
+                    UNION ALL
+                    SELECT {columns} FROM {archive.ARCHIVE_SCHEMA}.schedules WHERE 1=1{archive_where}
+                ) ORDER BY {order.order_by()}'''
+            params += archive_params
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return self.conn.execute(query, params)
+
+    def matches(self, search_term, category='全部', order=DEFAULT_ORDER, include_archive=False):
+        # 增量搜索使用：按 order 返回 (*排序键, title, description)；归档库没有全文索引，按 LIKE 匹配
+        where, params = self.filter(search_term, category)
+        columns = ', '.join(order.columns)
+        query = f'SELECT {columns}, title, description FROM main.schedules WHERE 1=1{where}'
+        if include_archive and self.attach_archive():
+            archive_where, archive_params = schedule_io.build_filter(search_term, category)
+            query += (f' UNION ALL SELECT {columns}, title, description'
+                      f' FROM {archive.ARCHIVE_SCHEMA}.schedules WHERE 1=1{archive_where}')
+            params += archive_params
+        return self.conn.execute(f'{query} ORDER BY {order.order_by()}', params)
+
+    def occurrences(self, start, end, category='全部'):
+        """返回日期范围 [start, end) 内的各次日程，按 (date, time, id) 排序。
+
+        一次性日程直接按日期范围查询；重复日程只读取规则行（数量与规则数成正比），
+        在这个窗口内展开，展开结果由 recurrence.expand 缓存。
+        返回的行与 LIST_COLUMNS 相同，date/time 为该次发生的时间。
+        """
+        where, params = self.filter('', category)
+        rows = self.conn.execute(f'''
+            SELECT {LIST_COLUMNS} FROM schedules
+            WHERE date >= ? AND date < ? AND rrule IS NULL{where}
+        ''', [start, end] + params).fetchall()
+        rows.extend(self.recurring(start, end, where, params))
+        rows.sort(key=lambda row: (row[2], row[3], row[0]))
+        return rows
+
+    def recurring(self, start, end, where='', params=()):
+        # 重复日程在 [start, end) 内的各次发生，行格式与 LIST_COLUMNS 相同
+        # 规则行很少，固定使用重复日程的部分索引，避免按分类筛选时扫描整个分类
+        window_start, window_end = f'{start} 00:00', f'{end} 00:00'
+        cursor = self.conn.execute(f'''
+            SELECT {LIST_COLUMNS}, rrule, {EXCEPTIONS_COLUMN} FROM schedules INDEXED BY idx_schedules_recurring
+            WHERE rrule IS NOT NULL AND date < ?{where}
+        ''', [end] + list(params))
+        for row in cursor.fetchall():
+            *row, rrule, exdates = row
+            for due_at in recurrence.expand(rrule, f'{row[2]} {row[3]}', window_start, window_end,
+                                            split_dates(exdates)):
+                row[2], row[3] = due_at.split(' ')
+                yield tuple(row)
+
+    def day_summary(self, start, end, category='全部'):
+        """返回 [start, end) 内每天的 {date: (总数, 未完成数, 未完成的高优先级数)}，没有日程的日期不出现。
+
+        不筛选分类时直接读取由触发器维护的 day_stats，只与天数有关；
+        筛选分类时在 (category, date, time) 索引上按天聚合。重复日程展开后计入。
+        """
+        if category == '全部':
+            cursor = self.conn.execute('''
+                SELECT date, total, pending, high FROM day_stats
+                WHERE date >= ? AND date < ? AND total > 0
+            ''', (start, end))
+        else:
+            cursor = self.conn.execute('''
+                SELECT date, COUNT(*), SUM(status = '未完成'), SUM(status = '未完成' AND priority = '高')
+                FROM schedules
+                WHERE category = ? AND date >= ? AND date < ? AND rrule IS NULL
+                GROUP BY date
+            ''', (category, start, end))
+        summary = {date: (total, pending, high) for date, total, pending, high in cursor}
+
+        where, params = self.filter('', category)
+        for row in self.recurring(start, end, where, params):
+            pending = row[6] == '未完成'
+            total, pending_count, high = summary.get(row[2], (0, 0, 0))
+            summary[row[2]] = (total + 1, pending_count + pending, high + (pending and row[5] == '高'))
+        return summary
+
+    def busy(self, window_start, window_end):
+        """返回与 [window_start, window_end) 重叠的未完成日程 (开始分钟, 结束分钟, id, title)，按开始时间排序。
+
+        一次性日程在区间索引 schedule_intervals 中查找，代价为 O(log n + k)；
+        没有区间索引时按日期范围扫描，向前多看最长时长所覆盖的天数。
+        重复日程把展开窗口向前延伸该规则的时长后展开。
+        """
+        low, high = to_minute(window_start), to_minute(window_end)
+        if self.intervals_enabled:
+            rows = self.conn.execute('''
+                SELECT i.start_minute, i.end_minute, s.id, s.title
+                FROM schedule_intervals i JOIN schedules s ON s.id = i.id
+                WHERE i.start_minute < ? AND i.end_minute > ?
+            ''', (high, low)).fetchall()
+        else:
+            longest = self.conn.execute('SELECT MAX(duration) FROM schedules WHERE rrule IS NULL').fetchone()[0] or 1
+            rows = [row for row in self.conn.execute(f'''
+                SELECT {START_MINUTE.format('schedules')}, {END_MINUTE.format('schedules')}, id, title
+                FROM schedules
+                WHERE date >= ? AND date <= ? AND rrule IS NULL AND status = '未完成'
+            ''', (from_minute(low - longest)[:10], window_end[:10])) if row[0] < high and row[1] > low]
+
+        # 状态在读出后再判断，使查询走重复日程的部分索引
+        cursor = self.conn.execute(f'''
+            SELECT id, title, date, time, duration, status, rrule, {EXCEPTIONS_COLUMN} FROM schedules
+            WHERE rrule IS NOT NULL AND date <= ?
+        ''', (window_end[:10],))
+        for schedule_id, title, start_date, start_time, duration, status, rrule, exdates in cursor.fetchall():
+            if status != '未完成':
+                continue
+            length = duration or 1
+            for due_at in recurrence.expand(rrule, f'{start_date} {start_time}', from_minute(low - length + 1), window_end,
+                                            split_dates(exdates)):
+                start = to_minute(due_at)
+                rows.append((start, start + length, schedule_id, title))
+
+        rows.sort()
+        return rows
+
+    def conflicts(self, date, time, duration=None, rrule=None):
+        """返回与新日程时间重叠的日程 (id, title, 开始, 结束)，时间为 'YYYY-MM-DD HH:MM'。
+
+        重复日程只检查第一次发生；没有时长的日程按 1 分钟计。
+        """
+        start = normalize_due(date, time)
+        if start is None:
+            raise ValueError("日期或时间格式不正确")
+        if rrule:
+            start = first_due(rrule, *start.split(' '))
+        end = from_minute(to_minute(start) + (duration or 1))
+        return [(schedule_id, title, from_minute(low), from_minute(high))
+                for low, high, schedule_id, title in self.busy(start, end)]
+
+    def free_slots(self, start, end, minutes, after=None, day_start='09:00', day_end='18:00', limit=20):
+        """在日期范围 [start, end) 内每天 day_start~day_end 之间查找至少 minutes 分钟的空闲时间。
+
+        先把范围内的占用区间按开始时间排序合并，再逐天扫描其中的空隙；
+        after 之前的时间不算空闲。返回最多 limit 个 (开始, 结束)。
+        """
+        if minutes <= 0:
+            raise ValueError("时长应为正整数（分钟）")
+        if normalize_due(start, day_start) is None or normalize_due(end, day_end) is None:
+            raise ValueError("日期或时间格式不正确")
+        day_start, day_end = normalize_due(start, day_start)[11:], normalize_due(start, day_end)[11:]
+        if day_start >= day_end:
+            raise ValueError("每天的开始时间应早于结束时间")
+
+        merged = []
+        for low, high, schedule_id, title in self.busy(f'{start} {day_start}', f'{end} {day_end}'):
+            if merged and low <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+
+        slots = []
+        day = Date.fromisoformat(normalize_due(start, day_start)[:10])
+        last = Date.fromisoformat(normalize_due(end, day_end)[:10])
+        index = 0
+        while day < last and len(slots) < limit:
+            free_from = to_minute(f'{day.isoformat()} {day_start}')
+            if after is not None:
+                free_from = max(free_from, to_minute(after))
+            close = to_minute(f'{day.isoformat()} {day_end}')
+            while index < len(merged) and merged[index][1] <= free_from:
+                index += 1
+            position = index
+            while position < len(merged) and merged[position][0] < close:
+                if merged[position][0] - free_from >= minutes:
+                    slots.append((from_minute(free_from), from_minute(merged[position][0])))
+                free_from = max(free_from, merged[position][1])
+                position += 1
+            if close - free_from >= minutes:
+                slots.append((from_minute(free_from), from_minute(close)))
+            day += timedelta(days=1)
+        return slots[:limit]
+
+    def head(self, where='', params=(), limit=100, order=DEFAULT_ORDER):
+        # 总行数和第一页一起读取，列表从顶部显示时只需一次往返
+        return self.count(where, params), self.page(('offset', 0, limit), where, params, order=order)
+
+    def page(self, request, where='', params=(), search_keys=None, order=DEFAULT_ORDER):
+        """读取列表的一页，request 为 (kind, anchor, limit)。
+
+        kind 为 'after'/'before' 时 anchor 是 order.key 给出的排序键，按键集分页；
+        为 'offset' 时 anchor 是行号。给出 search_keys 时在这些排序键中定位后按主键取行。
+        """
+        if search_keys is not None:
+            return self.search_page(request, search_keys)
+
+        # 只有远距离跳转时才使用 OFFSET
+        kind, anchor, limit = request
+        params = list(params)
+        reverse = kind == 'before'
+        if kind != 'offset':
+            where += ' AND ' + order.after(reverse)
+            params.extend(key_values(anchor))
+
+        query = f'SELECT {LIST_COLUMNS} FROM schedules WHERE 1=1{where} ORDER BY {order.order_by(reverse)} LIMIT ?'
+        params.append(limit)
+        if kind == 'offset':
+            query += ' OFFSET ?'
+            params.append(anchor)
+
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        if reverse:
+            rows.reverse()
+        return rows
+
+    def search_page(self, request, keys):
+        kind, anchor, limit = request
+        if kind == 'after':
+            low = bisect_right(keys, anchor)
+            high = low + limit
+        elif kind == 'before':
+            high = bisect_left(keys, anchor)
+            low = max(0, high - limit)
+        else:
+            low = anchor
+            high = low + limit
+
+        ids = [key_values(key)[-1] for key in keys[low:high]]
+        if not ids:
+            return []
+
+        cursor = self.conn.cursor()
+        placeholders = ', '.join('?' * len(ids))
+        cursor.execute(f'SELECT {LIST_COLUMNS} FROM main.schedules WHERE id IN ({placeholders})', ids)
+        rows = {row[0]: row for row in cursor.fetchall()}
+        archived = [schedule_id for schedule_id in ids if schedule_id not in rows]
+        if archived and self.attach_archive():
+            # 包含归档的搜索结果
+            cursor.execute(f'''
+                SELECT {LIST_COLUMNS} FROM {archive.ARCHIVE_SCHEMA}.schedules
+                WHERE id IN ({', '.join('?' * len(archived))})
+            ''', archived)
+            rows.update((row[0], row) for row in cursor.fetchall())
+        return [rows[schedule_id] for schedule_id in ids if schedule_id in rows]
+
+    # 提醒
+
+    def pending_reminders(self):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT due_at, id
+            FROM schedules
+            WHERE reminder = 1 AND status = '未完成' AND notified = 0 AND due_at IS NOT NULL
+        ''')
+        return cursor.fetchall()
+
+    @retry_busy
+    def claim_reminders(self, entries):
+        """认领到期的提醒，entries 为 pending_reminders 返回的 (due_at, id)。
+
+        已完成、已删除或到期时间已改变的条目被跳过；条件更新保证每次发生只提醒一次。
+        一次性日程标记为已提醒，重复日程把 due_at 顺延到当前时间之后的下一次发生
+        （关闭期间错过的多次只提醒一次）。返回 (到期的 (title, date, time) 列表,
+        顺延后的 (due_at, id) 列表)。
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M')
+        fired = []
+        rescheduled = []
+        cursor = self.conn.cursor()
+        for due_at, schedule_id in sorted(entries):
+            cursor.execute(f'''
+                SELECT title, rrule, date, time, {EXCEPTIONS_COLUMN} FROM schedules
+                WHERE id = ? AND due_at = ? AND reminder = 1 AND status = '未完成' AND notified = 0
+            ''', (schedule_id, due_at))
+            row = cursor.fetchone()
+            if row is None:
+                continue
+            title, rrule, date, time, exdates = row
+            next_due = None
+            if rrule:
+                next_due = recurrence.next_occurrence(rrule, f'{date} {time}', max(due_at, now), split_dates(exdates))
+            cursor.execute('''
+                UPDATE schedules SET due_at = COALESCE(?, due_at), notified = ?
+                WHERE id = ? AND due_at = ? AND notified = 0
+            ''', (next_due, 0 if next_due else 1, schedule_id, due_at))
+            if cursor.rowcount:
+                fired.append((title, *due_at.split(' ')))
+                if next_due:
+                    rescheduled.append((next_due, schedule_id))
+        self.conn.commit()
+        return fired, rescheduled
+
+    # 导入导出与维护
+
+    def export(self, path, fmt='csv', search_term='', category='全部', progress=None, include_archive=False):
+        where, params = self.filter(search_term, category)
+        archived = None
+        if include_archive and self.attach_archive():
+            archived = schedule_io.build_filter(search_term, category)
+        return schedule_io.export_schedules(self.conn, path, fmt, where, params, progress, archived)
+
+    def import_csv(self, path, progress=None):
+        return schedule_io.import_csv(self.conn, path, progress)
+
+    @retry_busy
+    def archive_batch(self, completed_before, horizon, limit=archive.ARCHIVE_BATCH):
+        # 移动一批可归档的行，返回移动的行数；调用方在返回值小于 limit 之前重复调用
+        self.attach_archive(create=True)
+        return archive.move_batch(self.conn, completed_before, horizon, limit)
+
+    @retry_busy
+    def maintain(self):
+        return archive.maintain(self.conn)
+
+    def rebuild_fts(self):
+        if not self.fts_enabled:
+            return False
+        rebuild_fts_index(self.conn)
+        return True
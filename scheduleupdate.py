@@ -1,9 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 from datetime import datetime
 import os
 
+from schedule_store import ScheduleStore
+
 class ScheduleManager:
     def __init__(self):
         self.root = tk.Tk()
@@ -19,7 +20,6 @@ class ScheduleManager:
         
         # 创建数据库连接
         self.db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedule.db')
-        self.conn = sqlite3.connect(self.db_path)
         self.create_table()
         
         # 创建界面
@@ -31,20 +31,7 @@ class ScheduleManager:
         style.configure("TButton", padding=5)
         
     def create_table(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS schedules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                description TEXT,
-                priority TEXT DEFAULT '普通',
-                status TEXT DEFAULT '未完成',
-                create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        self.conn.commit()
+        self.store = ScheduleStore(self.db_path)
         
     def create_gui(self):
         # 创建主框架
@@ -158,12 +145,7 @@ class ScheduleManager:
             messagebox.showerror("错误", "日期或时间格式不正确！\n日期格式：YYYY-MM-DD\n时间格式：HH:MM")
             return
             
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO schedules (title, date, time, description, priority)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, date, time, desc, priority))
-        self.conn.commit()
+        self.store.add(title, date, time, desc, priority)
         
         self.clear_inputs()
         self.refresh_list()
@@ -182,25 +164,9 @@ class ScheduleManager:
         for item in self.tree.get_children():
             self.tree.delete(item)
             
-        cursor = self.conn.cursor()
-        search_term = self.search_var.get()
-        
-        if search_term:
-            cursor.execute('''
-                SELECT title, date, time, priority, status 
-                FROM schedules 
-                WHERE title LIKE ? OR description LIKE ?
-                ORDER BY date, time
-            ''', (f'%{search_term}%', f'%{search_term}%'))
-        else:
-            cursor.execute('''
-                SELECT title, date, time, priority, status 
-                FROM schedules 
-                ORDER BY date, time
-            ''')
-            
-        for row in cursor.fetchall():
-            self.tree.insert('', tk.END, values=row)
+        # 以 schedules.id 作为 iid，同名同日期的日程也能区分
+        for schedule_id, title, date, time, category, priority, status in self.store.query(self.search_var.get()):
+            self.tree.insert('', tk.END, iid=schedule_id, values=(title, date, time, priority, status))
             
     def mark_complete(self):
         selected = self.tree.selection()
@@ -208,17 +174,7 @@ class ScheduleManager:
             messagebox.showwarning("警告", "请先选择一个日程！")
             return
             
-        item = self.tree.item(selected[0])
-        title = item['values'][0]
-        date = item['values'][1]
-        
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE schedules 
-            SET status = '已完成'
-            WHERE title = ? AND date = ?
-        ''', (title, date))
-        self.conn.commit()
+        self.store.complete([int(selected[0])])
         self.refresh_list()
         
     def delete_schedule(self):
@@ -228,13 +184,7 @@ class ScheduleManager:
             return
             
         if messagebox.askyesno("确认", "确定要删除选中的日程吗？"):
-            item = self.tree.item(selected[0])
-            title = item['values'][0]
-            date = item['values'][1]
-            
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM schedules WHERE title = ? AND date = ?', (title, date))
-            self.conn.commit()
+            self.store.delete([int(selected[0])])
             self.refresh_list()
             
     def run(self):
@@ -0,0 +1,86 @@
+"""单实例：再次启动图形界面时把请求转交给已经在运行的窗口。
+
+运行中的实例在 127.0.0.1 的随机端口上监听，把端口和随机令牌写入数据目录下的 INSTANCE_FILE；
+再次启动时先读取该文件并连接，对方确认后直接退出，不再导入 tkinter、打开数据库。
+文件已过期（上次异常退出）或连接失败时照常启动，并用新的端口覆盖该文件。
+需要同时打开多个窗口时使用 --new-window，多个窗口之间通过 PRAGMA data_version 同步修改。
+"""
+import json
+import os
+import queue
+import secrets
+import socket
+import threading
+
+INSTANCE_FILE = 'instance.json'
+CONNECT_TIMEOUT = 0.5  # 连接已运行实例的超时（秒），超时视为没有实例在运行
+MAX_MESSAGE = 4096
+
+
+def forward(data_dir, argv):
+    # 已有实例接受了本次启动时返回 True
+    try:
+        with open(os.path.join(data_dir, INSTANCE_FILE), encoding='utf-8') as f:
+            info = json.load(f)
+        with socket.create_connection(('127.0.0.1', info['port']), timeout=CONNECT_TIMEOUT) as conn:
+            message = {'token': info['token'], 'argv': list(argv)}
+            conn.sendall(json.dumps(message).encode('utf-8') + b'\n')
+            return conn.makefile('rb').readline(MAX_MESSAGE).strip() == b'ok'
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+class InstanceServer:
+    """接收后续启动转交的请求；poll 在界面线程中取出各次启动的命令行参数。"""
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, INSTANCE_FILE)
+        self.token = secrets.token_hex(16)
+        self.requests = queue.Queue()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'port': self.sock.getsockname()[1], 'token': self.token, 'pid': os.getpid()}, f)
+        os.replace(temp, self.path)
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                conn, address = self.sock.accept()
+            except OSError:
+                # close() 关闭了监听的套接字
+                return
+            with conn:
+                try:
+                    conn.settimeout(CONNECT_TIMEOUT)
+                    message = json.loads(conn.makefile('rb').readline(MAX_MESSAGE))
+                    if not secrets.compare_digest(str(message.get('token')), self.token):
+                        continue
+                    self.requests.put(message.get('argv') or [])
+                    conn.sendall(b'ok\n')
+                except (OSError, ValueError, AttributeError):
+                    continue
+
+    def poll(self):
+        requests = []
+        while True:
+            try:
+                requests.append(self.requests.get_nowait())
+            except queue.Empty:
+                return requests
+
+    def close(self):
+        self.sock.close()
+        # 期间若有其他实例覆盖了该文件，则保留它
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                if json.load(f).get('token') == self.token:
+                    os.remove(self.path)
+        except (OSError, ValueError):
+            pass
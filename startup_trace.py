@@ -0,0 +1,63 @@
+"""启动时间线。
+
+记录程序启动过程中各阶段（导入、打开数据库、迁移、首次绘制、首批数据）相对于
+主模块开始执行时的时间（毫秒）。解释器本身的启动和单文件打包的解压发生在这之前，不计入。
+开启后以一行 JSON 追加到指定文件，便于在不同版本、不同机器之间比较：
+
+    python schedule.py --startup-trace startup.jsonl
+    SCHEDULE_STARTUP_TRACE=- python schedule.py      # 输出到标准错误
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+TRACE_ENV = 'SCHEDULE_STARTUP_TRACE'
+
+
+def trace_target(argv):
+    # 命令行 --startup-trace [文件] 优先，其次是环境变量；都没有时返回 None
+    if '--startup-trace' in argv:
+        index = argv.index('--startup-trace')
+        if index + 1 < len(argv) and not argv[index + 1].startswith('-'):
+            return argv[index + 1]
+        return '-'
+    return os.environ.get(TRACE_ENV) or None
+
+
+class StartupTimeline:
+    """各阶段只记录第一次发生的时间；可以在任意线程中调用。"""
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.events = {}
+        self.lock = threading.Lock()
+
+    def elapsed(self, moment):
+        return round((moment - self.started) * 1000, 1)
+
+    def mark(self, name, moment=None):
+        # 某一时刻，记录为距开始的毫秒数
+        moment = moment if moment is not None else time.perf_counter()
+        with self.lock:
+            self.events.setdefault(name, self.elapsed(moment))
+
+    def span(self, name, start, end):
+        # 一段时间，记录为 [开始, 结束]
+        with self.lock:
+            self.events.setdefault(name, [self.elapsed(start), self.elapsed(end)])
+
+    def report(self):
+        with self.lock:
+            events = dict(self.events)
+        return {'timestamp': datetime.now().isoformat(timespec='seconds'), 'events': events}
+
+    def write(self, target):
+        import json
+        line = json.dumps(self.report(), ensure_ascii=False)
+        if target == '-':
+            print(line, file=sys.stderr)
+            return
+        with open(target, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
@@ -0,0 +1,28 @@
+import os
+import random
+import sys
+
+import pytest
+
+# 模块都在仓库根目录下，不是一个包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schedule_store import ScheduleStore
+
+
+@pytest.fixture(scope='module')
+def list_store(tmp_path_factory):
+    # 列表分页、排序测试共用的数据库：日期、时间只取少数几个值，使排序键的前几列大量相同，
+    # 顺序由末尾的 id 决定
+    store = ScheduleStore(str(tmp_path_factory.mktemp('list') / 'schedule.db'))
+    rng = random.Random(20261018)
+    store.add_many([dict(
+        title=rng.choice(['写周报', '开会', '买菜', 'Review']) + str(i % 5),
+        date=f'2026-10-{rng.randint(18, 21)}',
+        time=rng.choice(['09:00', '09:00', '13:30', '18:00']),
+        priority=rng.choice(['高', '普通', '低']),
+        category=rng.choice(['工作', '生活', '默认']),
+    ) for i in range(60)])
+    store.complete([row[0] for row in store.conn.execute('SELECT id FROM schedules WHERE id % 4 = 0')])
+    yield store
+    store.close()
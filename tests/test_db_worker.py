@@ -0,0 +1,36 @@
+"""后台执行器：回调出错后仍继续分发之后的结果。"""
+import time
+
+import pytest
+
+from db_worker import DatabaseExecutor
+from schedule_store import ScheduleStore
+
+
+def test_poll_survives_failing_callback(tmp_path):
+    scheduled = []
+    executor = DatabaseExecutor(lambda: ScheduleStore(str(tmp_path / 'schedule.db')),
+                                lambda delay, fn: scheduled.append(fn))
+    results = []
+
+    def failing(result):
+        raise RuntimeError('回调出错')
+
+    def pump():
+        while scheduled:
+            time.sleep(0.05)
+            scheduled.pop(0)()
+
+    try:
+        executor.read(ScheduleStore.count, callback=failing)
+        executor.read(ScheduleStore.count, callback=results.append)
+        with pytest.raises(RuntimeError):
+            pump()
+        pump()
+        # 出错之后提交的任务照常安排 poll 并执行回调
+        executor.read(ScheduleStore.count, callback=results.append)
+        pump()
+        assert results == [0, 0]
+        assert not executor.polling
+    finally:
+        executor.close()
@@ -0,0 +1,26 @@
+"""诊断：慢查询按实际的参数取得执行计划。"""
+import diagnostics
+from diagnostics import Diagnostics
+from schedule_store import ScheduleStore
+
+
+def test_slow_query_plan_uses_parameters(tmp_path, monkeypatch):
+    # 所有语句都算作慢查询
+    monkeypatch.setattr(diagnostics, 'SLOW_QUERY_MS', -1)
+    monitor = Diagnostics()
+    store = ScheduleStore(str(tmp_path / 'schedule.db'), monitor.connection_class)
+    try:
+        monitor.attach(store.conn)
+        store.add('周会', '2026-10-19', '09:00', category='工作')
+        where, params = store.filter('', '工作')
+        rows = monitor.run_task('page', ScheduleStore.page, store, (('offset', 0, 10), where, params))
+        assert [row[1] for row in rows] == ['周会']
+
+        slow = monitor.snapshot()[1]
+        assert slow and all(entry['task'] == 'page' for entry in slow)
+        plan = [step for entry in slow for step in entry['plan']]
+        assert plan
+        assert not any(step.startswith('EXPLAIN 失败') for step in plan)
+        assert any(step.startswith(('SEARCH', 'SCAN')) for step in plan)
+    finally:
+        store.close()
@@ -0,0 +1,117 @@
+"""从最初版本的数据库结构迁移到当前版本。"""
+import sqlite3
+
+import pytest
+
+from migrations import SCHEMA_VERSION, table_columns
+from schedule_store import ScheduleStore
+
+# 最初的 schedule.py 与 scheduleupdate.py 创建的表（后者没有 category、reminder）
+BASELINE_SCHEMAS = {
+    'schedule': '''
+        CREATE TABLE schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            description TEXT,
+            priority TEXT DEFAULT '普通',
+            status TEXT DEFAULT '未完成',
+            category TEXT DEFAULT '默认',
+            reminder INTEGER DEFAULT 0,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'scheduleupdate': '''
+        CREATE TABLE schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            description TEXT,
+            priority TEXT DEFAULT '普通',
+            status TEXT DEFAULT '未完成',
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+}
+
+BASELINE_ROWS = [
+    ('周会', '2024-5-6', '9:30', '讨论进度', '高', '未完成'),
+    ('交报告', '2024-05-06', '14:00', '', '普通', '已完成'),
+    ('体检', '2024-05-07', '08:05', '空腹', '低', '未完成'),
+]
+
+
+@pytest.fixture(params=sorted(BASELINE_SCHEMAS))
+def baseline_db(request, tmp_path):
+    path = str(tmp_path / 'schedule.db')
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMAS[request.param])
+    conn.executemany('INSERT INTO schedules (title, date, time, description, priority, status) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', BASELINE_ROWS)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_migrate_baseline(baseline_db):
+    store = ScheduleStore(baseline_db)
+    try:
+        cursor = store.conn.cursor()
+        assert cursor.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert {'category', 'reminder', 'due_at', 'notified', 'rrule', 'duration'} <= table_columns(cursor, 'schedules')
+
+        # 没有补零的日期、时间被统一，已有数据补齐到期时间和默认值
+        rows = cursor.execute('SELECT title, date, time, due_at, category, reminder FROM schedules ORDER BY id').fetchall()
+        assert rows == [
+            ('周会', '2024-05-06', '09:30', '2024-05-06 09:30', '默认', 0),
+            ('交报告', '2024-05-06', '14:00', '2024-05-06 14:00', '默认', 0),
+            ('体检', '2024-05-07', '08:05', '2024-05-07 08:05', '默认', 0),
+        ]
+
+        # 每日统计按已有数据重建
+        stats = cursor.execute('SELECT date, total, pending, high FROM day_stats ORDER BY date').fetchall()
+        assert stats == [('2024-05-06', 2, 1, 1), ('2024-05-07', 1, 1, 0)]
+
+        if store.fts_enabled:
+            where, params = store.filter('讨论进')
+            assert [row[1] for row in store.page(('offset', 0, 10), where, params)] == ['周会']
+
+        # 迁移后的表可以照常写入，触发器维护到期时间和统计
+        store.add('复查', '2024-5-7', '10:00', priority='高')
+        assert cursor.execute("SELECT high FROM day_stats WHERE date = '2024-05-07'").fetchone()[0] == 1
+    finally:
+        store.close()
+
+
+def test_migrate_is_idempotent(baseline_db):
+    ScheduleStore(baseline_db).close()
+    conn = sqlite3.connect(baseline_db)
+    schema = conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name').fetchall()
+    conn.close()
+
+    store = ScheduleStore(baseline_db)
+    try:
+        assert store.conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name').fetchall() == schema
+        assert store.count() == len(BASELINE_ROWS)
+    finally:
+        store.close()
+
+
+def test_migrate_from_intermediate_version(tmp_path):
+    # 已经应用了一部分迁移的数据库只执行剩下的迁移
+    path = str(tmp_path / 'schedule.db')
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMAS['schedule'])
+    conn.execute("INSERT INTO schedules (title, date, time) VALUES ('旧日程', '2024-1-2', '7:00')")
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+
+    store = ScheduleStore(path)
+    try:
+        assert store.conn.execute('SELECT date, time, due_at FROM schedules').fetchone() == \
+            ('2024-01-02', '07:00', '2024-01-02 07:00')
+    finally:
+        store.close()
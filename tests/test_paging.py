@@ -0,0 +1,69 @@
+"""列表的键集分页：逐页读取的结果应与整体排序一致，不重复也不遗漏。"""
+from schedule_store import DEFAULT_ORDER, LIST_COLUMNS
+
+PAGE = 7
+
+
+def all_rows(store, where='', params=()):
+    return store.conn.execute(f'SELECT {LIST_COLUMNS} FROM schedules WHERE 1=1{where}', params).fetchall()
+
+
+def walk(store, order, where='', params=(), limit=PAGE):
+    # 从顶部开始按锚点向后逐页读取，返回 (各页, 总行数)
+    total, rows = store.head(where, params, limit, order)
+    pages = [rows]
+    while rows:
+        rows = store.page(('after', order.key(rows[-1]), limit), where, params, order=order)
+        pages.append(rows)
+    return pages, total
+
+
+def walk_back(store, order, last_page, where='', params=(), limit=PAGE):
+    rows = last_page
+    walked = list(rows)
+    while rows:
+        rows = store.page(('before', order.key(rows[0]), limit), where, params, order=order)
+        walked[:0] = rows
+    return walked
+
+
+def test_keyset_forward_and_backward(list_store):
+    expected = sorted(all_rows(list_store), key=DEFAULT_ORDER.key)
+    pages, total = walk(list_store, DEFAULT_ORDER)
+    assert total == len(expected)
+    assert [row for page in pages for row in page] == expected
+    assert all(len(page) <= PAGE for page in pages)
+    assert walk_back(list_store, DEFAULT_ORDER, expected[-PAGE:]) == expected
+
+
+def test_offset_page(list_store):
+    # 远距离跳转使用 OFFSET，结果与键集分页一致
+    expected = sorted(all_rows(list_store), key=DEFAULT_ORDER.key)
+    for offset in (0, 10, len(expected) - 3):
+        assert list_store.page(('offset', offset, PAGE)) == expected[offset:offset + PAGE]
+
+
+def test_keyset_with_filter(list_store):
+    where, params = list_store.filter('', '工作')
+    expected = sorted(all_rows(list_store, where, params), key=DEFAULT_ORDER.key)
+    pages, total = walk(list_store, DEFAULT_ORDER, where, params)
+    assert total == len(expected)
+    assert [row for page in pages for row in page] == expected
+
+
+def test_search_keys(list_store):
+    # 增量搜索先取得全部排序键，再在其中定位分页
+    width = len(DEFAULT_ORDER.columns)
+    keys = [DEFAULT_ORDER.wrap(tuple(row[:width])) for row in list_store.matches('开会')]
+    where, params = list_store.filter('开会')
+    expected = sorted(all_rows(list_store, where, params), key=DEFAULT_ORDER.key)
+    assert keys == [DEFAULT_ORDER.key(row) for row in expected]
+
+    rows = list_store.page(('offset', 0, PAGE), search_keys=keys)
+    walked = list(rows)
+    while rows:
+        rows = list_store.page(('after', DEFAULT_ORDER.key(rows[-1]), PAGE), search_keys=keys)
+        walked += rows
+    assert walked == expected
+    anchor = DEFAULT_ORDER.key(expected[-1])
+    assert list_store.page(('before', anchor, PAGE), search_keys=keys) == expected[-PAGE - 1:-1]
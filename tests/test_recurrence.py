@@ -0,0 +1,86 @@
+"""重复规则展开：与手工推算的发生时间列表对照。"""
+import pytest
+
+from recurrence import expand, next_occurrence, parse_rule
+
+
+def days(occurrences):
+    return [moment[:10] for moment in occurrences]
+
+
+@pytest.mark.parametrize('rrule, start, window, expected', [
+    # 2026-10-19 是星期一
+    ('FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=5', '2026-10-19 09:00', ('2026-10-01 00:00', '2027-01-01 00:00'),
+     ['2026-10-19', '2026-10-21', '2026-10-23', '2026-10-26', '2026-10-28']),
+    # 首次时间不在 BYDAY 中时不算一次发生
+    ('FREQ=WEEKLY;BYDAY=TU,TH;COUNT=3', '2026-10-21 09:00', ('2026-10-01 00:00', '2027-01-01 00:00'),
+     ['2026-10-22', '2026-10-27', '2026-10-29']),
+    # 窗口从中间开始时，COUNT 仍从首次发生算起
+    ('FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=5', '2026-10-19 09:00', ('2026-10-22 00:00', '2027-01-01 00:00'),
+     ['2026-10-23', '2026-10-26', '2026-10-28']),
+    ('FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;COUNT=4', '2026-10-19 09:00', ('2026-10-01 00:00', '2027-01-01 00:00'),
+     ['2026-10-19', '2026-10-22', '2026-11-02', '2026-11-05']),
+    ('FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;COUNT=4', '2026-10-19 09:00', ('2026-10-25 00:00', '2027-01-01 00:00'),
+     ['2026-11-02', '2026-11-05']),
+    # 只有日期的 UNTIL 包含当天
+    ('FREQ=DAILY;UNTIL=20261021', '2026-10-19 09:00', ('2026-10-01 00:00', '2027-01-01 00:00'),
+     ['2026-10-19', '2026-10-20', '2026-10-21']),
+    ('FREQ=DAILY;UNTIL=20261021T080000', '2026-10-19 09:00', ('2026-10-01 00:00', '2027-01-01 00:00'),
+     ['2026-10-19', '2026-10-20']),
+    ('FREQ=DAILY;UNTIL=20261021T090000Z', '2026-10-19 09:00', ('2026-10-01 00:00', '2027-01-01 00:00'),
+     ['2026-10-19', '2026-10-20', '2026-10-21']),
+    # 窗口不包含结束时刻
+    ('FREQ=DAILY', '2026-10-19 09:00', ('2026-10-19 09:00', '2026-10-21 09:00'),
+     ['2026-10-19', '2026-10-20']),
+    # 没有 COUNT 时直接跳到远处的窗口（2026-10-19 之后第 1170 天是 2030-01-01）
+    ('FREQ=DAILY;INTERVAL=3', '2026-10-19 09:00', ('2030-01-01 00:00', '2030-01-08 00:00'),
+     ['2030-01-01', '2030-01-04', '2030-01-07']),
+    # 当月没有 31 日时跳过
+    ('FREQ=MONTHLY;COUNT=4', '2026-01-31 08:00', ('2026-01-01 00:00', '2027-01-01 00:00'),
+     ['2026-01-31', '2026-03-31', '2026-05-31', '2026-07-31']),
+    ('FREQ=MONTHLY;BYMONTHDAY=15;COUNT=2', '2026-10-20 08:00', ('2026-10-01 00:00', '2027-06-01 00:00'),
+     ['2026-11-15', '2026-12-15']),
+    ('FREQ=YEARLY;COUNT=2', '2024-02-29 08:00', ('2024-01-01 00:00', '2030-01-01 00:00'),
+     ['2024-02-29', '2028-02-29']),
+])
+def test_expand(rrule, start, window, expected):
+    occurrences = expand(rrule, start, *window)
+    assert days(occurrences) == expected
+    assert all(moment[11:] == start[11:] for moment in occurrences)
+
+
+def test_exdates_count_towards_count():
+    # 跳过的日期仍占用 COUNT 的次数（RFC 5545）
+    occurrences = expand('FREQ=DAILY;COUNT=5', '2026-10-19 09:00', '2026-10-01 00:00', '2027-01-01 00:00',
+                         ('2026-10-20', '2026-10-22'))
+    assert days(occurrences) == ['2026-10-19', '2026-10-21', '2026-10-23']
+
+
+def test_exdates_on_byday():
+    occurrences = expand('FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=5', '2026-10-19 09:00', '2026-10-01 00:00',
+                         '2027-01-01 00:00', ('2026-10-19', '2026-10-26'))
+    assert days(occurrences) == ['2026-10-21', '2026-10-23', '2026-10-28']
+
+
+def test_next_occurrence():
+    assert next_occurrence('FREQ=DAILY', '2026-10-19 09:00', None) == '2026-10-19 09:00'
+    # 严格晚于 after，并跳过例外日期
+    assert next_occurrence('FREQ=DAILY', '2026-10-19 09:00', '2026-10-19 09:00', ('2026-10-20',)) == '2026-10-21 09:00'
+    assert next_occurrence('FREQ=WEEKLY;BYDAY=TU,TH', '2026-10-19 09:00', '2026-10-22 09:00') == '2026-10-27 09:00'
+    assert next_occurrence('FREQ=DAILY;COUNT=2', '2026-10-19 09:00', '2026-10-20 09:00') is None
+    assert next_occurrence('FREQ=DAILY;UNTIL=20261019', '2026-10-19 09:00', None, ('2026-10-19',)) is None
+
+
+@pytest.mark.parametrize('rrule', [
+    'FREQ=HOURLY',
+    'FREQ=DAILY;BYDAY=MO',
+    'FREQ=WEEKLY;BYDAY=XX',
+    'FREQ=MONTHLY;BYMONTHDAY=32',
+    'FREQ=DAILY;COUNT=0',
+    'FREQ=DAILY;INTERVAL=0',
+    'FREQ=DAILY;BYSETPOS=1',
+    'FREQ',
+])
+def test_invalid_rules(rrule):
+    with pytest.raises(ValueError):
+        parse_rule(rrule)
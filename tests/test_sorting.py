@@ -0,0 +1,36 @@
+"""按列排序：每一种排序下数据库的顺序与排序键一致，键集分页不重复也不遗漏。"""
+import pytest
+
+from schedule_store import ListOrder, SORT_KEYS
+from test_paging import PAGE, all_rows, walk, walk_back
+
+ORDERS = [ListOrder(column, descending) for column in SORT_KEYS for descending in (False, True)]
+
+
+@pytest.mark.parametrize('order', ORDERS, ids=repr)
+def test_sql_order_matches_row_key(list_store, order):
+    # SQL 的 ORDER BY 与 order.key 给出的顺序相同，后者用于搜索结果和锚点
+    rows = list_store.page(('offset', 0, 1000), order=order)
+    assert rows == sorted(all_rows(list_store), key=order.key)
+
+
+@pytest.mark.parametrize('order', ORDERS, ids=repr)
+def test_keyset_in_every_order(list_store, order):
+    expected = sorted(all_rows(list_store), key=order.key)
+    pages, total = walk(list_store, order)
+    assert total == len(expected)
+    assert [row for page in pages for row in page] == expected
+    assert walk_back(list_store, order, expected[-PAGE:]) == expected
+
+
+@pytest.mark.parametrize('order', ORDERS, ids=repr)
+def test_search_keys_in_every_order(list_store, order):
+    width = len(order.columns)
+    keys = [order.wrap(tuple(row[:width])) for row in list_store.matches('开会', order=order)]
+    where, params = list_store.filter('开会')
+    assert keys == [order.key(row) for row in sorted(all_rows(list_store, where, params), key=order.key)]
+
+
+def test_unknown_column():
+    with pytest.raises(ValueError):
+        ListOrder('description')